@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.constants import (
+    TOKEN_CACHE_KEY_PREFIX,
+    TOKEN_REVOCATION_GENERATION_KEY
+)
+
+from .caching import bump_generation, get_generation
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_tokens = TTLCache(
+    settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_LOCAL_TTL
+)
+
+
+def shared_tokens():
+    if settings.TOKEN_CACHE_ALIAS:
+        return caches[settings.TOKEN_CACHE_ALIAS]
+    return None
+
+
+def token_cache_key(key):
+    return TOKEN_CACHE_KEY_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    shared = shared_tokens()
+    if shared is not None:
+        shared.delete(token_cache_key(key))
+    else:
+        bump_generation(TOKEN_REVOCATION_GENERATION_KEY)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches the token with its user.
+
+    With TOKEN_CACHE_ALIAS set, entries live only in that shared Django
+    cache, where deleting one revokes it for every process. Otherwise
+    they are kept in a bounded in-process cache under the current
+    revocation generation, which token deletion, deactivation and
+    password changes bump (see api.signals). The generation lives in the
+    default cache: with a shared backend (redis) that hides the local
+    entries of every worker, with the default per-process locmem backend
+    only those of the current one, and other workers keep theirs for up
+    to TOKEN_CACHE_LOCAL_TTL seconds.
+
+    The cached user is only good for authentication; views showing or
+    saving profile fields read the user from the database.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        shared = shared_tokens()
+        if shared is not None:
+            token = shared.get(cache_key)
+        else:
+            cache_key = (
+                get_generation(TOKEN_REVOCATION_GENERATION_KEY), cache_key)
+            token = local_tokens.get(cache_key)
+
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            if shared is not None:
+                shared.set(
+                    cache_key, token, settings.TOKEN_CACHE_SHARED_TTL)
+            else:
+                local_tokens.set(cache_key, token)
+            return user, token
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                "Пользователь неактивен или удалён.")
+        return token.user, token
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram.constants import (
+    RECIPES_CACHE_GENERATION_KEY,
+    RECIPES_CACHE_KEY_PREFIX,
+    RECIPES_CACHE_TIMEOUT,
+)
+
+
+def get_generation(key=RECIPES_CACHE_GENERATION_KEY):
+    # A fresh timestamp avoids reusing entries of an evicted generation.
+    return cache.get_or_set(key, time.time_ns, timeout=None)
+
+
+def bump_generation(key=RECIPES_CACHE_GENERATION_KEY):
+    """Move to the next generation and return it."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = time.time_ns()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def response_cache_key(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    signature = json.dumps(
+        [request.get_host(), request.path, params], ensure_ascii=False
+    )
+    return "{}{}:{}".format(
+        RECIPES_CACHE_KEY_PREFIX,
+        get_generation(),
+        hashlib.md5(signature.encode()).hexdigest(),
+    )
+
+
+class AnonymousResponseCacheMixin:
+    """Cache list and retrieve responses for anonymous users.
+
+    Entries are keyed by host, path and query params under the current
+    generation, so bump_generation() drops all of them at once.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_timeout(self):
+        return RECIPES_CACHE_TIMEOUT
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = quote_etag(hashlib.md5(json.dumps(
+                response.data, sort_keys=True, default=str
+            ).encode()).hexdigest())
+            cache.set(
+                key, (response.data, etag), self.get_response_cache_timeout())
+        else:
+            data, etag = cached
+            response = Response(data)
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Authorization",))
+        return response
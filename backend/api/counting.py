@@ -0,0 +1,67 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from foodgram.constants import (
+    COUNT_CACHE_KEY_PREFIX,
+    COUNT_CACHE_TIMEOUT,
+    COUNT_ESTIMATE_THRESHOLD,
+)
+
+
+class ExactCount:
+    """Plain COUNT(*) on every request."""
+
+    def count(self, queryset):
+        return queryset.count()
+
+
+class CachedCount:
+    """COUNT(*) cached for ``timeout`` seconds per SQL signature, so every
+    filter combination (including the filtering user) has its own entry."""
+
+    def __init__(self, timeout=COUNT_CACHE_TIMEOUT):
+        self.timeout = timeout
+
+    def count(self, queryset):
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        signature = hashlib.md5(
+            f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+        return cache.get_or_set(
+            COUNT_CACHE_KEY_PREFIX + signature, queryset.count, self.timeout)
+
+
+class EstimatedCount:
+    """``pg_class.reltuples`` for unfiltered querysets on PostgreSQL.
+
+    Filtered querysets, other databases and tables below ``threshold``
+    rows (where the estimate is relatively coarse) use ``fallback``.
+    """
+
+    def __init__(self, fallback=None, threshold=COUNT_ESTIMATE_THRESHOLD):
+        self.fallback = fallback or ExactCount()
+        self.threshold = threshold
+
+    def count(self, queryset):
+        connection = connections[queryset.db]
+        query = queryset.query
+        if (
+            connection.vendor == "postgresql"
+            and not query.where
+            and not query.distinct
+        ):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.threshold:
+                return row[0]
+        return self.fallback.count(queryset)
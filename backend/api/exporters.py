@@ -0,0 +1,128 @@
+import csv
+import json
+from html import escape
+
+
+EXPORTERS = {}
+
+
+def register_exporter(exporter_class):
+    EXPORTERS[exporter_class.format] = exporter_class
+    return exporter_class
+
+
+def get_exporter(export_format):
+    exporter_class = EXPORTERS.get(export_format)
+    return exporter_class() if exporter_class else None
+
+
+class ShoppingListExporter:
+    """Render aggregated ingredients as a stream of text chunks.
+
+    Rows are dicts with ``name``, ``measurement_unit`` and ``total`` keys.
+    """
+
+    format = None
+    content_type = None
+
+    def header(self):
+        return ""
+
+    def row(self, index, ingredient):
+        raise NotImplementedError
+
+    def footer(self):
+        return ""
+
+    def stream(self, ingredients):
+        yield self.header()
+        for index, ingredient in enumerate(ingredients):
+            yield self.row(index, ingredient)
+        yield self.footer()
+
+
+@register_exporter
+class TxtExporter(ShoppingListExporter):
+    format = "txt"
+    content_type = "text/plain; charset=utf-8"
+
+    def header(self):
+        return "Список покупок:\n\n"
+
+    def row(self, index, ingredient):
+        return "{}• {} - {} {}".format(
+            "\n" if index else "",
+            ingredient["name"],
+            ingredient["total"],
+            ingredient["measurement_unit"],
+        )
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+@register_exporter
+class CsvExporter(ShoppingListExporter):
+    format = "csv"
+    content_type = "text/csv; charset=utf-8"
+
+    def __init__(self):
+        self.writer = csv.writer(_Echo())
+
+    def header(self):
+        return self.writer.writerow(
+            ("Ингредиент", "Единица измерения", "Количество"))
+
+    def row(self, index, ingredient):
+        return self.writer.writerow((
+            ingredient["name"],
+            ingredient["measurement_unit"],
+            ingredient["total"],
+        ))
+
+
+@register_exporter
+class JsonExporter(ShoppingListExporter):
+    format = "json"
+    content_type = "application/json"
+
+    def header(self):
+        return "["
+
+    def row(self, index, ingredient):
+        return ("," if index else "") + json.dumps({
+            "name": ingredient["name"],
+            "measurement_unit": ingredient["measurement_unit"],
+            "amount": ingredient["total"],
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return "]"
+
+
+@register_exporter
+class HtmlExporter(ShoppingListExporter):
+    format = "html"
+    content_type = "text/html; charset=utf-8"
+
+    def header(self):
+        return (
+            "<!DOCTYPE html>\n<html lang=\"ru\">\n<head>\n"
+            "<meta charset=\"utf-8\">\n<title>Список покупок</title>\n"
+            "<style>body{font-family:sans-serif}"
+            "li{padding:4px 0}@media print{button{display:none}}</style>\n"
+            "</head>\n<body>\n<h1>Список покупок</h1>\n"
+            "<button onclick=\"window.print()\">Печать</button>\n<ul>\n"
+        )
+
+    def row(self, index, ingredient):
+        return "<li>{} - {} {}</li>\n".format(
+            escape(ingredient["name"]),
+            ingredient["total"],
+            escape(ingredient["measurement_unit"]),
+        )
+
+    def footer(self):
+        return "</ul>\n</body>\n</html>\n"
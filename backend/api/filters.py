@@ -1,12 +1,93 @@
+from django.db.models import Case, IntegerField, Value, When
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import FilterSet
-from domain.models import Recipe, Ingredient
+from domain.models import Recipe
+from domain.search import search_recipes
+from foodgram.constants import (
+    RECIPE_MATCH_ALL,
+    RECIPE_MATCH_ANY,
+    RECIPE_MATCH_DEFAULT_MAX_MISSING,
+    RECIPE_MATCH_MISSING,
+    RECIPE_ORDERINGS
+)
+
+from .ingredient_recipe_index import ingredient_recipe_index
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(FilterSet):
+    author = NumberInFilter()
+    cooking_time_min = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte')
+    cooking_time_max = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte')
+    created_after = filters.IsoDateTimeFilter(
+        field_name='created', lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(
+        field_name='created', lookup_expr='lt')
+    exclude_ingredients = NumberInFilter(
+        field_name='ingredients', exclude=True)
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    have_ingredients = NumberInFilter(method='filter_have_ingredients')
+    match = filters.ChoiceFilter(
+        choices=[(mode, mode) for mode in (
+            RECIPE_MATCH_ALL, RECIPE_MATCH_ANY, RECIPE_MATCH_MISSING)],
+        method='filter_noop')
+    max_missing = filters.NumberFilter(min_value=0, method='filter_noop')
+
+    # Declared last so that an explicit ordering wins over the ranking of
+    # search and have_ingredients.
+    ordering = filters.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in RECIPE_ORDERINGS],
+        method='filter_ordering')
+
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
+    def filter_have_ingredients(self, queryset, name, value):
+        """Recipes cookable from the given ingredients, best match first.
+
+        ``match=all`` keeps recipes with nothing missing, ``match=missing``
+        those missing at most ``max_missing`` ingredients; ``any`` (the
+        default) keeps every recipe using at least one of them.
+        """
+        mode = self.form.cleaned_data.get('match') or RECIPE_MATCH_ANY
+        max_missing = None
+        if mode == RECIPE_MATCH_ALL:
+            max_missing = 0
+        elif mode == RECIPE_MATCH_MISSING:
+            max_missing = self.form.cleaned_data.get('max_missing')
+            if max_missing is None:
+                max_missing = RECIPE_MATCH_DEFAULT_MAX_MISSING
+        matches = ingredient_recipe_index.match(
+            [int(pk) for pk in value], max_missing=max_missing)
+        if not matches:
+            return queryset.none()
+
+        groups = {}
+        for recipe_id, matched, missing in matches:
+            groups.setdefault((matched, missing), []).append(recipe_id)
+        return queryset.filter(
+            pk__in=[recipe_id for recipe_id, _, _ in matches]
+        ).annotate(ingredients_rank=Case(
+            *(When(pk__in=ids, then=Value(rank))
+              for rank, ids in enumerate(groups.values())),
+            output_field=IntegerField(),
+        )).order_by('ingredients_rank', '-created')
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and hasattr(self.request, 'user'
@@ -23,11 +104,3 @@ class RecipeFilter(FilterSet):
     class Meta:
         model = Recipe
         fields = ['author', 'is_favorited', 'is_in_shopping_cart']
-
-
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='startswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ("name",)
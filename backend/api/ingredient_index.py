@@ -0,0 +1,72 @@
+import threading
+from bisect import bisect_left
+
+from domain.models import Ingredient
+from foodgram.constants import INGREDIENTS_INDEX_GENERATION_KEY
+
+from .caching import bump_generation, get_generation
+
+
+def normalize(value):
+    return value.strip().casefold().replace("ё", "е")
+
+
+class IngredientIndex:
+    """Sorted in-process prefix index over ingredient names.
+
+    Loaded on first use and reloaded whenever the shared generation
+    counter changes, so every worker picks up ingredient edits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._index = ([], [])
+
+    def load(self, generation):
+        ingredients = sorted(
+            (
+                (normalize(name), name, unit, pk)
+                for pk, name, unit in Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit").order_by().iterator()
+            )
+        )
+        self._index = (
+            [row[0] for row in ingredients],
+            [
+                Ingredient(id=pk, name=name, measurement_unit=unit)
+                for _, name, unit, pk in ingredients
+            ],
+        )
+        self._generation = generation
+
+    def search(self, query, limit=None):
+        generation = get_generation(INGREDIENTS_INDEX_GENERATION_KEY)
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self.load(generation)
+        keys, ingredients = self._index
+
+        prefix = normalize(query)
+        if not prefix:
+            return ingredients[:limit]
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\U0010ffff", start)
+        query = query.strip()
+        # Whole-name matches first, then names starting exactly with the
+        # query, then those matched only after case and ё/е folding.
+        matches = sorted(
+            zip(keys[start:end], ingredients[start:end]),
+            key=lambda match: (
+                match[0] != prefix, not match[1].name.startswith(query)
+            ),
+        )
+        return [ingredient for _, ingredient in matches[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+def invalidate_ingredient_index():
+    bump_generation(INGREDIENTS_INDEX_GENERATION_KEY)
@@ -0,0 +1,241 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from domain.models import IngredientInRecipe
+from foodgram.constants import (
+    INGREDIENT_RECIPE_INDEX_GENERATION_KEY,
+    INGREDIENT_RECIPE_INDEX_RELOAD_INTERVAL,
+    RECIPE_MATCH_MAX_RESULTS,
+)
+
+from .caching import bump_generation, get_generation
+
+
+def to_bitmap(ids):
+    """Python int with bit ``id`` set for every id."""
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits_desc(bitmap):
+    while bitmap:
+        top = bitmap.bit_length() - 1
+        yield top
+        bitmap ^= 1 << top
+
+
+def count_bits(bitmaps):
+    """Bit-sliced per-position counters: bit ``i`` of the count of
+    position ``p`` is bit ``p`` of ``slices[i]``."""
+    slices = []
+    for carry in bitmaps:
+        for i, slice_ in enumerate(slices):
+            slices[i] = slice_ ^ carry
+            carry &= slice_
+            if not carry:
+                break
+        if carry:
+            slices.append(carry)
+    return slices
+
+
+def contains(posting, recipe_id):
+    if isinstance(posting, int):
+        return bool(posting >> recipe_id & 1)
+    i = bisect_left(posting, recipe_id)
+    return i < len(posting) and posting[i] == recipe_id
+
+
+class IngredientRecipeIndex:
+    """In-process inverted index from ingredient id to recipe ids.
+
+    A posting is an int bitmap when that is smaller than a sorted array of
+    ids, and the array otherwise. Matching a set of ingredients is then a
+    handful of big-integer operations per ingredient instead of a GROUP BY
+    over IngredientInRecipe.
+
+    Writes made in this process are applied incrementally, and the
+    generation they produce is adopted when no other process wrote since,
+    so the writer does not reload. Other workers reload when the shared
+    generation counter moves, at most once per
+    INGREDIENT_RECIPE_INDEX_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._loaded_at = 0.0
+        self._postings = {}
+        self._sizes = {}
+        self._by_size = {}
+
+    def load(self, generation):
+        postings = defaultdict(lambda: array("q"))
+        sizes = Counter()
+        for ingredient_id, recipe_id in (
+            IngredientInRecipe.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator(chunk_size=10000)
+        ):
+            postings[ingredient_id].append(recipe_id)
+            sizes[recipe_id] += 1
+
+        max_id = max(sizes, default=0)
+        by_size = defaultdict(list)
+        for recipe_id, size in sizes.items():
+            by_size[size].append(recipe_id)
+        self._postings = {
+            ingredient_id: to_bitmap(ids) if len(ids) * 64 > max_id else ids
+            for ingredient_id, ids in postings.items()
+        }
+        self._sizes = dict(sizes)
+        self._by_size = {
+            size: to_bitmap(ids) for size, ids in by_size.items()
+        }
+        self._generation = generation
+        self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        generation = get_generation(INGREDIENT_RECIPE_INDEX_GENERATION_KEY)
+        if generation == self._generation or (
+            self._generation is not None
+            and time.monotonic() - self._loaded_at
+            < INGREDIENT_RECIPE_INDEX_RELOAD_INTERVAL
+        ):
+            return
+        with self._lock:
+            if generation != self._generation:
+                self.load(generation)
+
+    def match(
+        self, ingredient_ids, max_missing=None, limit=RECIPE_MATCH_MAX_RESULTS
+    ):
+        """Recipes using any of ``ingredient_ids``.
+
+        Returns up to ``limit`` (recipe id, matched, missing) tuples: most
+        matched ingredients first, then fewest missing ones, then newest.
+        ``max_missing`` drops recipes needing more ingredients than that.
+        """
+        self.refresh()
+        bitmaps = [
+            posting if isinstance(posting, int) else to_bitmap(posting)
+            for posting in map(self._postings.get, set(ingredient_ids))
+            if posting
+        ]
+        if not bitmaps:
+            return []
+
+        slices = count_bits(bitmaps)
+        candidates = 0
+        for bitmap in bitmaps:
+            candidates |= bitmap
+        by_size = sorted(self._by_size.items())
+
+        groups = []
+        # No recipe matched more often than the counters can represent.
+        most = min(len(bitmaps), (1 << len(slices)) - 1)
+        for matched in range(most, 0, -1):
+            exact = candidates
+            for bit, slice_ in enumerate(slices):
+                exact &= slice_ if matched >> bit & 1 else ~slice_
+            for size, recipes in by_size:
+                missing = size - matched
+                if missing < 0 or (
+                    max_missing is not None and missing > max_missing
+                ):
+                    continue
+                group = exact & recipes
+                if group:
+                    groups.append((matched, missing, group))
+
+        groups.sort(key=lambda group: (-group[0], group[1]))
+        result = []
+        for matched, missing, group in groups:
+            for recipe_id in iter_bits_desc(group):
+                result.append((recipe_id, matched, missing))
+                if len(result) >= limit:
+                    return result
+        return result
+
+    def add(self, recipe_id, ingredient_id):
+        with self._lock:
+            if self._generation is not None:
+                self._add(recipe_id, ingredient_id)
+            self._bump_generation()
+
+    def discard(self, recipe_id, ingredient_id):
+        with self._lock:
+            if self._generation is not None:
+                self._discard(recipe_id, ingredient_id)
+            self._bump_generation()
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Replace the ingredients of one recipe."""
+        ingredient_ids = set(ingredient_ids)
+        with self._lock:
+            if self._generation is not None:
+                current = {
+                    ingredient_id
+                    for ingredient_id, posting in self._postings.items()
+                    if contains(posting, recipe_id)
+                }
+                for ingredient_id in current - ingredient_ids:
+                    self._discard(recipe_id, ingredient_id)
+                for ingredient_id in ingredient_ids - current:
+                    self._add(recipe_id, ingredient_id)
+            self._bump_generation()
+
+    def _bump_generation(self):
+        generation = bump_generation(INGREDIENT_RECIPE_INDEX_GENERATION_KEY)
+        # Only the step from the loaded generation is this write alone; any
+        # other gap includes writes of other processes, left to a reload.
+        if self._generation is not None and (
+            generation == self._generation + 1
+        ):
+            self._generation = generation
+
+    # Postings are replaced, never mutated, so that match() running in
+    # another thread sees either the old or the new version.
+    def _add(self, recipe_id, ingredient_id):
+        posting = self._postings.get(ingredient_id, array("q"))
+        if contains(posting, recipe_id):
+            return
+        if isinstance(posting, int):
+            posting |= 1 << recipe_id
+        else:
+            posting = posting[:]
+            posting.insert(bisect_left(posting, recipe_id), recipe_id)
+        self._postings[ingredient_id] = posting
+        self._resize(recipe_id, 1)
+
+    def _discard(self, recipe_id, ingredient_id):
+        posting = self._postings.get(ingredient_id)
+        if posting is None or not contains(posting, recipe_id):
+            return
+        if isinstance(posting, int):
+            posting &= ~(1 << recipe_id)
+        else:
+            posting = posting[:]
+            del posting[bisect_left(posting, recipe_id)]
+        self._postings[ingredient_id] = posting
+        self._resize(recipe_id, -1)
+
+    def _resize(self, recipe_id, delta):
+        bit = 1 << recipe_id
+        size = self._sizes.pop(recipe_id, 0)
+        if size:
+            self._by_size[size] &= ~bit
+        size += delta
+        if size:
+            self._sizes[recipe_id] = size
+            self._by_size[size] = self._by_size.get(size, 0) | bit
+
+
+ingredient_recipe_index = IngredientRecipeIndex()
@@ -1,8 +1,186 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import cached_property, partial
 
-from foodgram.constants import MAIN_PAGE_RECORDS_LIMIT
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    LimitOffsetPagination,
+    PageNumberPagination
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.constants import (
+    CURSOR_PAGINATION,
+    MAIN_PAGE_RECORDS_LIMIT,
+    PAGINATION_QUERY_PARAM,
+)
+
+from .counting import ExactCount
+
+
+def get_count_strategy(view):
+    """Views choose how totals are counted with a ``count_strategy``."""
+    return getattr(view, "count_strategy", None) or ExactCount()
+
+
+class CountingPaginator(Paginator):
+
+    def __init__(self, *args, count_strategy, **kwargs):
+        self.count_strategy = count_strategy
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        return self.count_strategy.count(self.object_list)
 
 
 class MainPagePagination(PageNumberPagination):
     page_size_query_param = "limit"
     page_size = MAIN_PAGE_RECORDS_LIMIT
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CountingPaginator, count_strategy=get_count_strategy(view))
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CountingLimitOffsetPagination(LimitOffsetPagination):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_strategy = get_count_strategy(view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        return self.count_strategy.count(queryset)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on (ordering_field, pk).
+
+    Runs no COUNT query and no OFFSET scan: every page is a range
+    condition on an index. The response has the same next/previous/results
+    keys as the page number pagination, without count.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = MAIN_PAGE_RECORDS_LIMIT
+    ordering_field = "created"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = queryset.model._meta.get_field(self.ordering_field)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[0]
+
+        if cursor is not None:
+            _, value, pk = cursor
+            lookup = "lt" if reverse else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.ordering_field}__{lookup}": value})
+                | Q(**{self.ordering_field: value, f"pk__{lookup}": pk})
+            )
+        prefix = "-" if reverse else ""
+        queryset = queryset.order_by(
+            prefix + self.ordering_field, prefix + "pk")
+
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def get_page_size(self, request):
+        limit = request.query_params.get(self.page_size_query_param, "")
+        return int(limit) if limit.isdigit() and int(limit) else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            reverse, value, pk = json.loads(
+                urlsafe_b64decode(encoded.encode()).decode())
+            value = self.field.to_python(value)
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or type(pk) is not int:
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), value, pk
+
+    def encode_cursor(self, instance, reverse):
+        value = self.field.value_to_string(instance)
+        cursor = json.dumps([int(reverse), value, instance.pk])
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+
+class FeedPagination(KeysetPagination):
+    """Forward-only keyset pagination over a newest-first feed."""
+
+    def paginate_feed(self, load, model, request):
+        """``load(before, limit)`` returns up to ``limit`` objects older
+        than the (ordering value, pk) key ``before``, newest first."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = model._meta.get_field(self.ordering_field)
+        cursor = self.decode_cursor(request)
+        page = load(
+            None if cursor is None else cursor[1:], self.page_size + 1)
+        self.has_next = len(page) > self.page_size
+        self.has_previous = False
+        self.page = page[:self.page_size]
+        return self.page
+
+
+class CursorPaginationOptInMixin:
+    """Switch a view to ``cursor_pagination_class`` on ?pagination=cursor."""
+
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.request.query_params.get(
+            PAGINATION_QUERY_PARAM
+        ) == CURSOR_PAGINATION:
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering_field = "username"
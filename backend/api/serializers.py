@@ -1,14 +1,18 @@
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 
-from drf_extra_fields.fields import Base64ImageField
+from domain.constants import IMAGE_RENDITIONS
+from domain.images import RenditionImageField, RenditionSrcsetField
 from domain.models import User
 
+from .viewer import get_viewer
+
 
 class UserProfileSerializer(UserCreateSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField()
+    avatar = RenditionImageField(fit=IMAGE_RENDITIONS["thumbnail"])
+    avatar_srcset = RenditionSrcsetField(source="avatar")
 
     class Meta:
         model = User
@@ -20,13 +24,13 @@ class UserProfileSerializer(UserCreateSerializer):
             "last_name",
             "is_subscribed",
             "avatar",
+            "avatar_srcset",
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.followers.filter(subscriber=request.user).exists()
-        return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        return get_viewer(self.context.get('request')).follows(obj)
 
 
 class CreateUserProfileSerializer(UserProfileSerializer):
@@ -45,13 +49,16 @@ class CreateUserProfileSerializer(UserProfileSerializer):
 
 
 class UserProfileAvatarSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField()
+    avatar = RenditionImageField(fit=IMAGE_RENDITIONS["thumbnail"])
 
     class Meta:
         model = User
         fields = ("avatar",)
 
     def to_representation(self, instance):
+        # Renditions written on commit, replacing the avatar, are not on
+        # the saved instance yet.
+        instance.refresh_from_db(fields=("avatar", "avatar_renditions"))
         representation = super().to_representation(instance)
         request = self.context.get('request')
         if representation['avatar'] and request:
@@ -0,0 +1,122 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from domain.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    bulk_relations_changed,
+    recipe_ingredients_changed
+)
+
+from .authentication import invalidate_token
+from .caching import bump_generation
+from .ingredient_index import invalidate_ingredient_index
+from .ingredient_recipe_index import ingredient_recipe_index
+from .viewer import invalidate_viewer
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# Fields whose change must stop cached tokens from authenticating.
+TOKEN_USER_FIELDS = ("is_active", "password")
+
+
+@receiver(pre_save, sender=get_user_model())
+def remember_token_user_fields(sender, instance, update_fields=None,
+                               **kwargs):
+    if update_fields is None and instance.pk is not None:
+        instance._token_user_fields = sender.objects.filter(
+            pk=instance.pk).values_list(*TOKEN_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, update_fields=None,
+                           **kwargs):
+    # Logins, avatars and the like leave the token cache alone: revoking
+    # empties the local cache of every worker.
+    if created:
+        return
+    if update_fields is not None:
+        if not set(update_fields) & set(TOKEN_USER_FIELDS):
+            return
+    elif getattr(instance, "_token_user_fields", None) == tuple(
+        getattr(instance, field) for field in TOKEN_USER_FIELDS
+    ):
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        "key", flat=True
+    ):
+        invalidate_token(key)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=get_user_model())
+@receiver(recipe_ingredients_changed)
+def invalidate_recipe_responses(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which recipe responses do not show.
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    # After commit: a response cached in between under the new generation
+    # would otherwise keep the uncommitted state.
+    transaction.on_commit(bump_generation)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def refresh_ingredient_index(sender, **kwargs):
+    invalidate_ingredient_index()
+
+
+# The in-process index follows committed writes only: it adopts the
+# generation of its own writes, so this process would not reload to undo
+# one that was rolled back.
+@receiver(post_save, sender=IngredientInRecipe)
+def index_recipe_ingredient(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        ingredient_recipe_index.add,
+        instance.recipe_id, instance.ingredient_id,
+    ))
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def unindex_recipe_ingredient(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        ingredient_recipe_index.discard,
+        instance.recipe_id, instance.ingredient_id,
+    ))
+
+
+@receiver(recipe_ingredients_changed)
+def reindex_recipe_ingredients(sender, recipe, ingredient_ids, **kwargs):
+    transaction.on_commit(partial(
+        ingredient_recipe_index.set_recipe, recipe.pk, list(ingredient_ids)
+    ))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def invalidate_viewer_recipes(sender, instance, **kwargs):
+    invalidate_viewer(sender, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_viewer_authors(sender, instance, **kwargs):
+    invalidate_viewer(sender, instance.subscriber_id)
+
+
+@receiver(bulk_relations_changed)
+def invalidate_viewer_bulk(sender, owner, **kwargs):
+    invalidate_viewer(sender, owner.pk)
@@ -0,0 +1,108 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from domain.models import Favorite, ShoppingCart, Subscription
+from foodgram.constants import VIEWER_CACHE_KEY_PREFIX, VIEWER_CONTEXT_MAX_IDS
+
+# kind: (relation model, owner field, target id field)
+RELATIONS = {
+    "favorite": (Favorite, "user", "recipe_id"),
+    "shopping_cart": (ShoppingCart, "user", "recipe_id"),
+    "followed": (Subscription, "subscriber", "author_id"),
+}
+RELATION_KINDS = {model: kind for kind, (model, *_) in RELATIONS.items()}
+
+_missing = object()
+
+
+def viewer_cache_key(kind, user_id):
+    return f"{VIEWER_CACHE_KEY_PREFIX}{kind}:{user_id}"
+
+
+def invalidate_viewer(model, user_id):
+    if settings.VIEWER_CACHE_TIMEOUT:
+        # On commit: deleted earlier, the entry could be cached again by a
+        # request still reading the relations as they were.
+        transaction.on_commit(partial(
+            cache.delete, viewer_cache_key(RELATION_KINDS[model], user_id)))
+
+
+class ViewerContext:
+    """Ids the requesting user has favorited, put in the cart or follows.
+
+    Each set is loaded on first use with one query, or read from the
+    cache when VIEWER_CACHE_TIMEOUT is set. Users with more than
+    ``max_ids`` relations of a kind get None for that set, and the
+    ``has_*`` checks fall back to one EXISTS per object.
+    """
+
+    def __init__(self, user, max_ids=VIEWER_CONTEXT_MAX_IDS):
+        self.user = user
+        self.max_ids = max_ids
+
+    @cached_property
+    def favorite_ids(self):
+        return self._load("favorite")
+
+    @cached_property
+    def shopping_cart_ids(self):
+        return self._load("shopping_cart")
+
+    @cached_property
+    def followed_ids(self):
+        return self._load("followed")
+
+    def has_favorite(self, recipe):
+        return self._contains("favorite", self.favorite_ids, recipe.pk)
+
+    def has_in_shopping_cart(self, recipe):
+        return self._contains(
+            "shopping_cart", self.shopping_cart_ids, recipe.pk)
+
+    def follows(self, author):
+        return self._contains("followed", self.followed_ids, author.pk)
+
+    def _contains(self, kind, ids, target_id):
+        if ids is not None:
+            return target_id in ids
+        model, owner_field, target_field = RELATIONS[kind]
+        return model.objects.filter(
+            **{owner_field: self.user, target_field: target_id}
+        ).exists()
+
+    def _load(self, kind):
+        if not self.user.is_authenticated:
+            return frozenset()
+
+        timeout = settings.VIEWER_CACHE_TIMEOUT
+        key = viewer_cache_key(kind, self.user.pk)
+        if timeout:
+            ids = cache.get(key, _missing)
+            if ids is not _missing:
+                return ids
+
+        model, owner_field, target_field = RELATIONS[kind]
+        ids = list(
+            model.objects.filter(**{owner_field: self.user})
+            .order_by()
+            .values_list(target_field, flat=True)[:self.max_ids + 1]
+        )
+        ids = frozenset(ids) if len(ids) <= self.max_ids else None
+        if timeout:
+            cache.set(key, ids, timeout)
+        return ids
+
+
+def get_viewer(request):
+    """The request's ViewerContext, created on first use."""
+    if request is None:
+        return ViewerContext(AnonymousUser())
+    viewer = getattr(request, "viewer_context", None)
+    if viewer is None:
+        viewer = request.viewer_context = ViewerContext(request.user)
+    return viewer
@@ -2,20 +2,89 @@ from django.contrib import admin
 from django.contrib.admin import ModelAdmin, register
 from django.contrib.auth.admin import UserAdmin
 
-from .constants import INGREDIENT_INLINE_MIN_AMOUNT
+from api.counting import EstimatedCount
+from api.ingredient_index import ingredient_index
+from api.pagination import CountingPaginator
+
+from .constants import (
+    INGREDIENT_ADMIN_SEARCH_LIMIT,
+    INGREDIENT_INLINE_MIN_AMOUNT
+)
 from .models import (
     Favorite,
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeActivity,
     ShoppingCart,
+    ShoppingListItem,
     Subscription,
     User
 )
 
 
+class EstimatedCountPaginator(CountingPaginator):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, count_strategy=EstimatedCount(), **kwargs)
+
+
+class LargeTableAdminMixin:
+    """Change list settings for tables too big to COUNT(*) on every page.
+
+    Search fields use case-sensitive prefix lookups so that PostgreSQL can
+    answer them from the ``*_like`` indexes on the searched columns.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PrefixListFilter(admin.SimpleListFilter):
+    """Text input filtering ``field`` by prefix.
+
+    Replaces list_filter on columns with too many distinct values to list
+    as links.
+    """
+
+    template = "admin/prefix_filter.html"
+    field = None
+
+    def lookups(self, request, model_admin):
+        # Never shown; the filter is hidden when there are no lookups.
+        return (("", ""),)
+
+    def get_facet_queryset(self, changelist):
+        return {}
+
+    def choices(self, changelist):
+        params = changelist.params.copy()
+        params.pop(self.parameter_name, None)
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(
+                remove=[self.parameter_name]),
+            "display": "Все",
+            "params": params.items(),
+        }
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f"{self.field}__startswith": self.value()})
+        return queryset
+
+
+def prefix_filter(field, title):
+    return type(
+        f"{field.title().replace('_', '')}Filter",
+        (PrefixListFilter,),
+        {"field": field, "title": title, "parameter_name": field},
+    )
+
+
 @register(User)
-class UserAdminConfig(UserAdmin):
+class UserAdminConfig(LargeTableAdminMixin, UserAdmin):
     list_display = (
         "pk",
         "username",
@@ -25,60 +94,104 @@ class UserAdminConfig(UserAdmin):
         "password",
         "avatar",
         "recipes_count",
-        "subscribers_count",
+        "followers_count",
+        "following_count",
     )
-    list_filter = ("username", "email")
-    search_fields = ("username", "email")
-
-    @admin.display(description="Количество рецептов")
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description="Количество подписчиков")
-    def subscribers_count(self, obj):
-        return obj.subscriptions_where_author.count()
+    list_filter = (
+        prefix_filter("username", "имени пользователя"),
+        prefix_filter("email", "почте"),
+    )
+    search_fields = ("username__startswith", "email__startswith")
 
 
 @register(Ingredient)
-class IngredientAdmin(ModelAdmin):
+class IngredientAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ("pk", "name", "measurement_unit")
     search_fields = ("name",)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Also serves the inline autocomplete on every keystroke, so a
+        # short term must not turn into an IN list of the whole table.
+        if not search_term:
+            return queryset, False
+        ingredients = ingredient_index.search(
+            search_term, limit=INGREDIENT_ADMIN_SEARCH_LIMIT)
+        return queryset.filter(
+            pk__in=[ingredient.pk for ingredient in ingredients]
+        ), False
+
 
 class IngredientInRecipeInline(admin.TabularInline):
     model = IngredientInRecipe
     min_num = INGREDIENT_INLINE_MIN_AMOUNT
+    autocomplete_fields = ("ingredient",)
 
 
 @register(Recipe)
-class RecipeAdmin(ModelAdmin):
-    list_display = ("pk", "name", "author", "get_favorites", "created")
-    list_filter = ("author", "name")
-    search_fields = ("name", "author__username")
+class RecipeAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = (
+        "pk",
+        "name",
+        "author",
+        "favorites_count",
+        "shopping_carts_count",
+        "created",
+    )
+    list_select_related = ("author",)
+    autocomplete_fields = ("author",)
+    list_filter = (
+        prefix_filter("author__username", "автору"),
+        prefix_filter("name", "названию"),
+    )
+    search_fields = ("name__startswith", "author__username__startswith")
     inlines = [IngredientInRecipeInline]
 
-    @admin.display(description="Количество добавлений рецепта в избранное")
-    def get_favorites(self, obj):
-        return obj.favorites.count()
-
 
 @register(IngredientInRecipe)
-class IngredientInRecipe(ModelAdmin):
+class IngredientInRecipeAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ("pk", "recipe", "ingredient", "amount")
+    list_select_related = ("recipe", "ingredient")
+    autocomplete_fields = ("recipe", "ingredient")
 
 
 @register(ShoppingCart)
-class ShoppingCartAdmin(ModelAdmin):
-    list_display = ("pk", "user", "recipe")
+class ShoppingCartAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ("pk", "user", "recipe", "created")
+    list_select_related = ("user", "recipe")
+    autocomplete_fields = ("user", "recipe")
+
+
+@register(RecipeActivity)
+class RecipeActivityAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ("pk", "recipe", "bucket", "favorites", "shopping_carts")
+    list_select_related = ("recipe",)
+    autocomplete_fields = ("recipe",)
+
+
+@register(ShoppingListItem)
+class ShoppingListItemAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ("pk", "user", "ingredient", "total")
+    list_select_related = ("user", "ingredient")
+    autocomplete_fields = ("user", "ingredient")
 
 
 @register(Subscription)
-class SubscriptionAdmin(ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ("pk", "subscriber", "author")
-    search_fields = ("subscriber__username", "author__username")
-    list_filter = ("subscriber", "author")
+    list_select_related = ("subscriber", "author")
+    autocomplete_fields = ("subscriber", "author")
+    list_filter = (
+        prefix_filter("subscriber__username", "подписчику"),
+        prefix_filter("author__username", "автору"),
+    )
+    search_fields = (
+        "subscriber__username__startswith",
+        "author__username__startswith",
+    )
 
 
 @register(Favorite)
-class FavoriteAdmin(ModelAdmin):
-    list_display = ("pk", "user", "recipe")
+class FavoriteAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ("pk", "user", "recipe", "created")
+    list_select_related = ("user", "recipe")
+    autocomplete_fields = ("user", "recipe")
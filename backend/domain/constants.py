@@ -2,6 +2,7 @@ INGREDIENT_NAME_MAX_LENGTH = 128
 INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH = 64
 INGREDIENT_MIN_AMOUNT_IN_RECIPE = 1
 INGREDIENT_INLINE_MIN_AMOUNT = 1
+INGREDIENT_ADMIN_SEARCH_LIMIT = 100
 RECIPE_NAME_MAX_LENGTH = 256
 RECIPE_MIN_COOKING_TIME = 1
 RECIPE_IMAGE_UPLOAD_TO = "recipes/"
@@ -10,3 +11,25 @@ USER_USERNAME_MAX_LENGTH = 150
 USER_FIRST_NAME_MAX_LENGTH = 150
 USER_LAST_NAME_MAX_LENGTH = 150
 USER_AVATAR_UPLOAD_TO = "users/"
+IMAGE_RENDITIONS = {"thumbnail": 160, "card": 480, "full": 1280}
+IMAGE_RENDITIONS_DIR = "renditions/"
+IMAGE_RENDITION_QUALITY = 82
+IMAGE_SIZE_QUERY_PARAM = "image_size"
+IMAGE_ORIGINAL_SIZE = "original"
+BULK_RELATIONS_MAX_RECIPES = 100
+RELATION_CREATED = "created"
+RELATION_EXISTS = "exists"
+RELATION_DELETED = "deleted"
+RELATION_MISSING = "missing"
+RELATION_NOT_FOUND = "not_found"
+RELATION_SELF = "self"
+BULK_SUBSCRIPTIONS_MAX_AUTHORS = 100
+FEED_INBOX_MIN_FOLLOWING = 1000
+FEED_INBOX_BACKFILL = 50
+FEED_MERGE_BATCH_SIZE = 200
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_FAVORITE_WEIGHT = 2
+TRENDING_SHOPPING_CART_WEIGHT = 1
+RECIPE_ACTIVITY_HOURLY_DAYS = 2
+RECIPE_ACTIVITY_RETENTION_DAYS = 8
@@ -0,0 +1,82 @@
+"""Chronological feed of recipes by the authors a user follows.
+
+Users following fewer than FEED_INBOX_MIN_FOLLOWING authors get a k-way
+merge of per-author streams, each read newest first from the
+(author, created) index. Users above the threshold get a fan-out-on-write
+inbox (FeedItem) that is filled when recipes are published.
+"""
+import heapq
+from collections import defaultdict
+from itertools import batched, islice
+
+from django.db import connections, models
+from django.db.models.functions import RowNumber
+
+from .constants import FEED_INBOX_MIN_FOLLOWING, FEED_MERGE_BATCH_SIZE
+from .models import FeedItem, Recipe, Subscription, User
+
+
+def before_key(before, created_field, pk_field):
+    created, pk = before
+    return models.Q(**{f"{created_field}__lt": created}) | models.Q(
+        **{created_field: created, f"{pk_field}__lt": pk})
+
+
+def recipe_feed(user, before=None, limit=10):
+    """Newest ``limit`` (created, recipe id) keys of the user's feed.
+
+    ``before`` is the (created, recipe id) key of the last recipe of the
+    previous page.
+    """
+    # Read the flags from the database: request.user may come from the
+    # token cache.
+    has_inbox, following = User.objects.filter(pk=user.pk).values_list(
+        "has_feed_inbox", "following_count").get()
+    if not has_inbox and following >= FEED_INBOX_MIN_FOLLOWING:
+        FeedItem.objects.build(user.pk)
+        has_inbox = True
+
+    if has_inbox:
+        items = FeedItem.objects.filter(user=user)
+        if before is not None:
+            items = items.filter(before_key(before, "created", "recipe_id"))
+        return list(
+            items.order_by("-created", "-recipe_id")
+            .values_list("created", "recipe_id")[:limit]
+        )
+
+    author_ids = Subscription.objects.filter(
+        subscriber=user
+    ).order_by().values_list("author_id", flat=True)
+    streams = defaultdict(list)
+    for chunk in batched(author_ids, FEED_MERGE_BATCH_SIZE):
+        for author_id, created, pk in author_streams(chunk, before, limit):
+            streams[author_id].append((created, pk))
+    for stream in streams.values():
+        stream.sort(reverse=True)
+    return list(islice(heapq.merge(*streams.values(), reverse=True), limit))
+
+
+def author_streams(author_ids, before, limit):
+    """Up to ``limit`` newest (author id, created, pk) rows per author."""
+    recipes = Recipe.objects.all()
+    if before is not None:
+        recipes = recipes.filter(before_key(before, "created", "pk"))
+
+    if connections[recipes.db].features.supports_slicing_ordering_in_compound:
+        # One LIMIT-ed index range scan per author.
+        per_author = [
+            recipes.filter(author_id=author_id)
+            .order_by("-created", "-pk")
+            .values_list("author_id", "created", "pk")[:limit]
+            for author_id in author_ids
+        ]
+        return per_author[0].union(*per_author[1:], all=True)
+
+    return recipes.filter(author_id__in=author_ids).annotate(
+        row_number=models.Window(
+            RowNumber(),
+            partition_by=models.F("author"),
+            order_by=(models.F("created").desc(), models.F("pk").desc()),
+        )
+    ).filter(row_number__lte=limit).values_list("author_id", "created", "pk")
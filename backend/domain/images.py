@@ -0,0 +1,256 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from drf_extra_fields.fields import Base64ImageField
+from PIL import ExifTags, Image, ImageOps, features
+from rest_framework import serializers
+
+from api.caching import bump_generation
+
+from .constants import (
+    IMAGE_ORIGINAL_SIZE,
+    IMAGE_RENDITION_QUALITY,
+    IMAGE_RENDITIONS,
+    IMAGE_RENDITIONS_DIR,
+    IMAGE_SIZE_QUERY_PARAM,
+)
+from .models import Recipe, User
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMAT, RENDITION_EXTENSION = (
+    ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+)
+
+IMAGE_FIELDS = {Recipe: "image", User: "avatar"}
+
+_executor = None
+
+
+def renditions_field(field_name):
+    return f"{field_name}_renditions"
+
+
+def rendition_path(source, name):
+    directory, filename = posixpath.split(source)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory,
+        IMAGE_RENDITIONS_DIR,
+        f"{stem}_{name}.{RENDITION_EXTENSION}",
+    )
+
+
+def renditions_are_current(instance, field_name):
+    image = getattr(instance, field_name)
+    renditions = getattr(instance, renditions_field(field_name))
+    if not image:
+        return not renditions
+    return {
+        name: rendition["path"] for name, rendition in renditions.items()
+    } == {
+        name: rendition_path(image.name, name) for name in IMAGE_RENDITIONS
+    }
+
+
+def encode(image, size):
+    rendition = image.copy()
+    rendition.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if RENDITION_FORMAT == "JPEG" or rendition.mode not in ("RGB", "RGBA"):
+        rendition = rendition.convert(
+            "RGBA" if RENDITION_FORMAT == "WEBP"
+            and "A" in rendition.getbands() else "RGB"
+        )
+    buffer = BytesIO()
+    # Nothing from the source metadata (EXIF, GPS, ICC) is written back.
+    rendition.save(
+        buffer, RENDITION_FORMAT, quality=IMAGE_RENDITION_QUALITY
+    )
+    return ContentFile(buffer.getvalue()), rendition.width
+
+
+def strip_metadata(image):
+    """Copy of an image without EXIF (GPS included), XMP or text chunks,
+    in its own format.
+
+    The EXIF orientation is applied to the pixels first; a JPEG that needs
+    no rotation keeps its quantization tables, so it is not degraded.
+    """
+    image_format = image.format
+    options = {}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    if getattr(image, "is_animated", False):
+        options["save_all"] = True
+    elif image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    elif image_format == "JPEG":
+        options["quality"] = "keep"
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_renditions(model, pk, field_name, force=False):
+    """Replace an uploaded image with a metadata-free copy and write its
+    resized renditions.
+
+    The copy is saved under a new name and the original is deleted only
+    once the row points at the copy, so a failure loses no upload.
+    """
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None or (
+            not force and renditions_are_current(instance, field_name)
+        ):
+            return
+        image_file = getattr(instance, field_name)
+        old_renditions = getattr(instance, renditions_field(field_name))
+
+        source_name = stripped_name = image_file.name or ""
+        renditions = {}
+        if image_file:
+            with image_file.open("rb") as source:
+                image = Image.open(source)
+                stripped_name = default_storage.save(
+                    source_name, strip_metadata(image),
+                    max_length=image_file.field.max_length)
+                image.seek(0)
+                image = ImageOps.exif_transpose(image)
+                for name, size in IMAGE_RENDITIONS.items():
+                    path = rendition_path(stripped_name, name)
+                    content, width = encode(image, size)
+                    default_storage.delete(path)
+                    renditions[name] = {
+                        "path": default_storage.save(path, content),
+                        "width": width,
+                    }
+
+        paths = {rendition["path"] for rendition in renditions.values()}
+        # Skip the write if the image was replaced in the meantime.
+        if not model.objects.filter(
+            pk=pk, **{field_name: source_name}
+        ).update(**{
+            field_name: stripped_name,
+            renditions_field(field_name): renditions,
+        }):
+            for path in paths | {stripped_name} - {source_name}:
+                default_storage.delete(path)
+            return False
+        if stripped_name != source_name:
+            default_storage.delete(source_name)
+        for rendition in old_renditions.values():
+            if rendition["path"] not in paths:
+                default_storage.delete(rendition["path"])
+
+        bump_generation()
+        return True
+    except Exception:
+        logger.exception(
+            "Не удалось обработать изображение %s #%s", model.__name__, pk)
+        return False
+    finally:
+        if settings.IMAGE_PROCESSING_WORKERS:
+            connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix="images",
+        )
+    return _executor
+
+
+def schedule_renditions(instance, field_name):
+    task = partial(generate_renditions, type(instance), instance.pk,
+                   field_name)
+    if settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(task))
+    else:
+        transaction.on_commit(task)
+
+
+def get_renditions(image_file):
+    return getattr(
+        image_file.instance, renditions_field(image_file.field.name), None
+    ) or {}
+
+
+def rendition_url(image_file, fit=None):
+    """URL of the smallest rendition at least ``fit`` pixels wide, or None
+    until the renditions are written."""
+    renditions = get_renditions(image_file)
+    available = sorted(
+        (size, name) for name, size in IMAGE_RENDITIONS.items()
+        if name in renditions
+    )
+    if not available:
+        return None
+    fitting = [item for item in available if fit and item[0] >= fit]
+    _, name = fitting[0] if fitting else available[-1]
+    return default_storage.url(renditions[name]["path"])
+
+
+def absolute_url(context, url):
+    request = context.get("request")
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class RenditionImageField(Base64ImageField):
+    """Base64 image input; outputs the smallest rendition that fits.
+
+    ``?image_size=original`` overrides the fit like a rendition name does.
+    Nothing is output until the renditions are written: the upload keeps
+    its metadata until then, the worker replaces it with a stripped copy.
+    """
+
+    def __init__(self, *args, fit=None, **kwargs):
+        self.fit = fit
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, value):
+        if not value or not get_renditions(value):
+            return None
+        request = self.context.get("request")
+        image_size = request and request.query_params.get(
+            IMAGE_SIZE_QUERY_PARAM)
+        if image_size == IMAGE_ORIGINAL_SIZE:
+            url = value.url
+        else:
+            url = rendition_url(
+                value, IMAGE_RENDITIONS.get(image_size, self.fit))
+        return absolute_url(self.context, url)
+
+
+class RenditionSrcsetField(serializers.Field):
+    """Read-only ``srcset`` string listing the renditions of an image."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        # Images smaller than a rendition size are not upscaled, so several
+        # renditions can share a width; a srcset lists each width once.
+        paths = {}
+        for rendition in get_renditions(value).values():
+            paths.setdefault(rendition["width"], rendition["path"])
+        return ", ".join(
+            "{} {}w".format(
+                absolute_url(self.context, default_storage.url(path)), width)
+            for width, path in sorted(paths.items())
+        ) or None
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from domain.constants import (
+    RECIPE_ACTIVITY_HOURLY_DAYS,
+    RECIPE_ACTIVITY_RETENTION_DAYS
+)
+from domain.models import RecipeActivity
+
+
+class Command(BaseCommand):
+    help = (
+        "Объединяет почасовую активность рецептов в дневную и удаляет "
+        "записи старше срока хранения."
+    )
+
+    def handle(self, *args, **options):
+        today = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        merged = RecipeActivity.objects.compact(
+            today - timedelta(days=RECIPE_ACTIVITY_HOURLY_DAYS))
+        deleted, _ = RecipeActivity.objects.filter(
+            bucket__lt=today - timedelta(days=RECIPE_ACTIVITY_RETENTION_DAYS)
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            "Объединено записей: {}, удалено: {}".format(merged, deleted)
+        ))
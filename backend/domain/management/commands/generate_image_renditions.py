@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from domain.images import (
+    IMAGE_FIELDS,
+    generate_renditions,
+    renditions_are_current,
+    renditions_field
+)
+
+
+def process_image(model_label, pk, field_name, force):
+    return generate_renditions(
+        apps.get_model(model_label), pk, field_name, force=force)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт уменьшенные копии для уже загруженных фотографий рецептов "
+        "и аватаров в нескольких процессах."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Количество процессов.")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Пересоздать копии, даже если они актуальны.")
+
+    def handle(self, *args, **options):
+        tasks = []
+        for model, field_name in IMAGE_FIELDS.items():
+            instances = model.objects.exclude(**{field_name: ""}).only(
+                "pk", field_name, renditions_field(field_name)
+            ).order_by()
+            tasks.extend(
+                (model._meta.label, instance.pk, field_name, options["force"])
+                for instance in instances.iterator()
+                if options["force"]
+                or not renditions_are_current(instance, field_name)
+            )
+
+        processed = 0
+        if tasks:
+            # Forked workers must not share the parent's DB connection.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=django.setup
+            ) as executor:
+                processed = sum(
+                    bool(result) for result in executor.map(
+                        process_image, *zip(*tasks), chunksize=16)
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {processed} из {len(tasks)}"))
@@ -0,0 +1,138 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.ingredient_index import invalidate_ingredient_index
+from domain.constants import (
+    INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH,
+    INGREDIENT_NAME_MAX_LENGTH,
+)
+from domain.models import Ingredient
+
+INGREDIENT_FIXTURE_MODEL = "domain.ingredient"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Yield the items of a top-level JSON array without loading it all."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        char = buffer[position:position + 1]
+        if char and not started:
+            if char != "[":
+                raise CommandError("Ожидается JSON-массив.")
+            started = True
+            position += 1
+            continue
+        if char == ",":
+            position += 1
+            continue
+        if char == "]":
+            return
+        if char:
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise CommandError(f"Некорректный JSON: {error}")
+            else:
+                yield item
+                continue
+        if eof:
+            raise CommandError("Неожиданный конец JSON-файла.")
+        chunk = file.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_json(file):
+    for item in iter_json_array(file):
+        if "model" in item:
+            if item["model"] != INGREDIENT_FIXTURE_MODEL:
+                continue
+            item = item.get("fields", {})
+        yield item.get("name"), item.get("measurement_unit")
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or row[:2] == ["name", "measurement_unit"]:
+            continue
+        yield row[0], row[1]
+
+
+READERS = {
+    ".json": read_json,
+    ".csv": read_csv,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает ингредиенты из JSON (фикстура или список объектов) "
+        "или CSV (name,measurement_unit). Повторный запуск не создаёт "
+        "дубликатов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format", choices=[ext[1:] for ext in READERS],
+            help="Формат файла; по умолчанию определяется по расширению.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        extension = (
+            f".{options['format']}" if options["format"] else path.suffix
+        )
+        reader = READERS.get(extension.lower())
+        if reader is None:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+
+        started = time.monotonic()
+        existing = Ingredient.objects.count()
+        read = skipped = 0
+        batch = []
+        with path.open(encoding="utf-8", newline="") as file, \
+                transaction.atomic():
+            for name, measurement_unit in reader(file):
+                read += 1
+                name = (name or "").strip()
+                measurement_unit = (measurement_unit or "").strip()
+                if (
+                    not name or not measurement_unit
+                    or len(name) > INGREDIENT_NAME_MAX_LENGTH
+                    or len(measurement_unit)
+                    > INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH
+                ):
+                    skipped += 1
+                    continue
+                batch.append(Ingredient(
+                    name=name, measurement_unit=measurement_unit))
+                if len(batch) >= options["batch_size"]:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True)
+                    batch = []
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        invalidate_ingredient_index()
+
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - existing
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано: {read}, добавлено: {created}, "
+            f"пропущено: {skipped}, уже было: {read - skipped - created}. "
+            f"{elapsed:.2f} с, {read / elapsed if elapsed else read:.0f} "
+            f"строк/с."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from domain.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает списки покупок всех пользователей."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ShoppingListItem.objects.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            "Пересчитано позиций: {}".format(
+                ShoppingListItem.objects.count())
+        ))
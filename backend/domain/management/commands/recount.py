@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from domain.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики рецептов, подписок и избранного."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = User.objects.recount()
+            recipes = Recipe.objects.recount()
+        self.stdout.write(self.style.SUCCESS(
+            "Пересчитано пользователей: {}, рецептов: {}".format(
+                users, recipes)
+        ))
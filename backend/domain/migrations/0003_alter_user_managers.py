@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 05:56
+
+import domain.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', domain.models.UserProfileManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+SETUP = {
+    'postgresql': (
+        "ALTER TABLE domain_recipe ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+        ") STORED",
+        "CREATE INDEX recipe_search_vector_idx ON domain_recipe "
+        "USING gin (search_vector)",
+    ),
+    'sqlite': (
+        "CREATE VIRTUAL TABLE domain_recipe_search USING fts5("
+        "name, text, tokenize = 'unicode61 remove_diacritics 2')",
+        "INSERT INTO domain_recipe_search (rowid, name, text) "
+        "SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), "
+        "replace(replace(text, 'ё', 'е'), 'Ё', 'Е') FROM domain_recipe",
+    ),
+}
+TEARDOWN = {
+    'postgresql': (
+        "DROP INDEX recipe_search_vector_idx",
+        "ALTER TABLE domain_recipe DROP COLUMN search_vector",
+    ),
+    'sqlite': (
+        "DROP TABLE domain_recipe_search",
+    ),
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0007_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SETUP), run(TEARDOWN)),
+    ]
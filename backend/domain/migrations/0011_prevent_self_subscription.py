@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 06:50
+
+from django.db import migrations, models
+
+
+def delete_self_subscriptions(apps, schema_editor):
+    User = apps.get_model('domain', 'User')
+    Subscription = apps.get_model('domain', 'Subscription')
+    self_subscriptions = Subscription.objects.filter(
+        subscriber=models.F('author'))
+    User.objects.filter(
+        pk__in=self_subscriptions.values('author')
+    ).update(
+        followers_count=models.F('followers_count') - 1,
+        following_count=models.F('following_count') - 1,
+    )
+    self_subscriptions.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domain', '0010_recipe_activity'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_self_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.CheckConstraint(condition=models.Q(('subscriber', models.F('author')), _negated=True), name='prevent_self_subscription'),
+        ),
+    ]
@@ -1,16 +1,38 @@
+from datetime import timedelta
+
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import connections, models, transaction
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db.models.constants import OnConflict
+from django.db.models.functions import (
+    Coalesce,
+    Greatest,
+    RowNumber,
+    TruncDay
+)
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils import timezone
 
 from .constants import (
+    FEED_INBOX_BACKFILL,
     INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH,
     INGREDIENT_MIN_AMOUNT_IN_RECIPE,
     INGREDIENT_NAME_MAX_LENGTH,
     RECIPE_IMAGE_UPLOAD_TO,
     RECIPE_MIN_COOKING_TIME,
     RECIPE_NAME_MAX_LENGTH,
-
+    RELATION_CREATED,
+    RELATION_DELETED,
+    RELATION_EXISTS,
+    RELATION_MISSING,
+    RELATION_NOT_FOUND,
+    RELATION_SELF,
+    TRENDING_FAVORITE_WEIGHT,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_SHOPPING_CART_WEIGHT,
+    TRENDING_WINDOW_DAYS,
     USER_AVATAR_UPLOAD_TO,
     USER_EMAIL_MAX_LENGTH,
     USER_FIRST_NAME_MAX_LENGTH,
@@ -19,11 +41,67 @@ from .constants import (
 )
 
 
+def count_related(model, field):
+    """Subquery counting ``model`` rows whose ``field`` is the outer pk."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(**{field: models.OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=models.Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+class CounterQuerySet(models.QuerySet):
+
+    def adjust_counter(self, field, delta):
+        """Shift a denormalized counter by ``delta`` in one UPDATE."""
+        return self.update(**{field: Greatest(models.F(field) + delta, 0)})
+
+
+class UserQuerySet(CounterQuerySet):
+
+    def recount(self):
+        return self.update(
+            recipes_count=count_related(Recipe, "author"),
+            followers_count=count_related(Subscription, "author"),
+            following_count=count_related(Subscription, "subscriber"),
+        )
+
+    def with_recipes(self, recipes_limit=None):
+        """Prefetch up to ``recipes_limit`` recipes per user into
+        ``limited_recipes`` with one windowed query."""
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=models.Window(
+                    RowNumber(),
+                    partition_by=models.F("author"),
+                    order_by=Recipe._meta.ordering,
+                )
+            ).filter(row_number__lte=recipes_limit)
+
+        return self.prefetch_related(
+            models.Prefetch(
+                "recipes", queryset=recipes, to_attr="limited_recipes"
+            )
+        )
+
+
+class UserProfileManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
 
+    objects = UserProfileManager()
+
     email = models.EmailField(
         verbose_name="Электронная почта",
         max_length=USER_EMAIL_MAX_LENGTH,
@@ -49,6 +127,32 @@ class User(AbstractUser):
         upload_to=USER_AVATAR_UPLOAD_TO,
         blank=True,
     )
+    avatar_renditions = models.JSONField(
+        verbose_name="Уменьшенные копии аватара",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Количество подписок",
+        default=0,
+        editable=False,
+    )
+    has_feed_inbox = models.BooleanField(
+        verbose_name="Лента собирается при публикации",
+        default=False,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Пользователь"
@@ -118,6 +222,49 @@ class IngredientInRecipe(models.Model):
         return f"{self.ingredient} {self.recipe}"
 
 
+class RecipeQuerySet(CounterQuerySet):
+
+    def recount(self):
+        return self.update(
+            favorites_count=count_related(Favorite, "recipe"),
+            shopping_carts_count=count_related(ShoppingCart, "recipe"),
+        )
+
+    def with_relations(self, viewer):
+        """Load everything RecipeSerializer reads in a constant number
+        of queries, regardless of the page size.
+
+        ``viewer`` is the request's ViewerContext. The is_favorited,
+        is_in_shopping_cart and is_subscribed flags are answered from its
+        id sets; they are annotated here only for a set it could not load.
+        """
+        user = viewer.user
+        annotations = {}
+        authors = User.objects.all()
+        if user.is_authenticated:
+            if viewer.favorite_ids is None:
+                annotations["is_favorited"] = models.Exists(
+                    Favorite.objects.filter(
+                        user=user, recipe=models.OuterRef("pk")))
+            if viewer.shopping_cart_ids is None:
+                annotations["is_in_shopping_cart"] = models.Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=models.OuterRef("pk")))
+            if viewer.followed_ids is None:
+                authors = authors.annotate(
+                    is_subscribed=models.Exists(Subscription.objects.filter(
+                        subscriber=user, author=models.OuterRef("pk"))))
+
+        return self.prefetch_related(
+            models.Prefetch("author", queryset=authors),
+            models.Prefetch(
+                "ingredients_in_recipe",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient").order_by()
+            ),
+        ).annotate(**annotations)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -125,12 +272,20 @@ class Recipe(models.Model):
         verbose_name="Автор ",
     )
     name = models.CharField(
-        max_length=RECIPE_NAME_MAX_LENGTH, verbose_name="Название"
+        max_length=RECIPE_NAME_MAX_LENGTH,
+        db_index=True,
+        verbose_name="Название",
     )
     image = models.ImageField(
         verbose_name="Фотография",
         upload_to=RECIPE_IMAGE_UPLOAD_TO,
     )
+    image_renditions = models.JSONField(
+        verbose_name="Уменьшенные копии фотографии",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(verbose_name="Описание")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -139,21 +294,49 @@ class Recipe(models.Model):
     )
     cooking_time = models.PositiveSmallIntegerField(
         "Время готовки",
+        db_index=True,
         validators=[
             MinValueValidator(RECIPE_MIN_COOKING_TIME),
         ],
     )
     created = models.DateTimeField(
         auto_now_add=True,
-        db_index=True,
         verbose_name="Дата публикации",
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        verbose_name="В списках покупок",
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         default_related_name = "recipes"
         ordering = ("created",)
+        indexes = [
+            models.Index(
+                fields=("author", "-created", "-id"),
+                name="recipe_author_created_idx",
+            ),
+            # Serves both directions of the (created, id) order used by
+            # listings, keyset pages and created date ranges.
+            models.Index(
+                fields=("created", "id"),
+                name="recipe_created_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-id"),
+                name="recipe_popularity_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -162,6 +345,184 @@ class Recipe(models.Model):
         return f'/recipes/{self.pk}'
 
 
+# Sent by RelationQuerySet.add_many()/remove_many() instead of a model
+# signal per row, with ``owner``, the changed ``target_ids`` and ``sign``
+# (1 for added pairs, -1 for removed ones).
+bulk_relations_changed = Signal()
+
+# Sent after IngredientInRecipe rows of ``recipe`` were written with
+# bulk_create(), which fires no model signals; ``ingredient_ids`` is the
+# full new set of its ingredients.
+recipe_ingredients_changed = Signal()
+
+
+class RelationQuerySet(models.QuerySet):
+    """Single-statement writes for models linking an owner to a target
+    under a unique constraint.
+
+    Writes bypass Model.save()/delete(): add() and remove() send the model
+    signals themselves for the counter and shopping list receivers, the
+    bulk methods call _relations_changed() once instead. Either way the
+    row and its derived data are written in one transaction.
+    """
+
+    owner_field = "user"
+    target_field = "recipe"
+
+    def add(self, owner, target):
+        """INSERT unless the pair exists; returns False on conflict."""
+        self._for_write = True
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        instance = self.model(
+            **{self.owner_field: owner, self.target_field: target})
+        fields = [
+            field for field in opts.local_concrete_fields
+            if not field.primary_key
+        ]
+        sql = "{} {} ({}) VALUES ({}) {}".format(
+            connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            quote_name(opts.db_table),
+            ", ".join(quote_name(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+            connection.ops.on_conflict_suffix_sql(
+                fields, OnConflict.IGNORE, None, None),
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [
+                    field.get_db_prep_save(
+                        field.pre_save(instance, add=True), connection)
+                    for field in fields
+                ])
+                if not cursor.rowcount:
+                    return False
+
+            post_save.send(
+                sender=self.model,
+                instance=instance,
+                created=True,
+                update_fields=None,
+                raw=False,
+                using=self.db,
+            )
+        return True
+
+    def remove(self, owner, target_id):
+        """DELETE the pair; returns False if there was nothing to delete."""
+        self._for_write = True
+        pair = {self.owner_field: owner, f"{self.target_field}_id": target_id}
+        relations = self.filter(**pair)
+        with transaction.atomic(using=self.db):
+            if not relations._raw_delete(self.db):
+                return False
+
+            instance = self.model(**pair)
+            for signal in (pre_delete, post_delete):
+                signal.send(
+                    sender=self.model,
+                    instance=instance,
+                    using=self.db,
+                    origin=relations,
+                )
+        return True
+
+    def add_many(self, owner, target_ids):
+        """Link ``owner`` to every existing target in ``target_ids``.
+
+        Returns ``{target_id: outcome}``. One query classifies the ids,
+        one INSERT ... ON CONFLICT DO NOTHING writes the new pairs.
+        """
+        self._for_write = True
+        linked = self._classify(owner, target_ids)
+        created = [pk for pk, exists in linked.items() if not exists]
+        if created:
+            with transaction.atomic(using=self.db):
+                self.bulk_create(
+                    [
+                        self.model(**{
+                            self.owner_field: owner,
+                            f"{self.target_field}_id": pk,
+                        })
+                        for pk in created
+                    ],
+                    ignore_conflicts=True,
+                )
+                self._relations_changed(owner, created, 1)
+            bulk_relations_changed.send(
+                sender=self.model, owner=owner, target_ids=created, sign=1)
+
+        return {
+            pk: RELATION_NOT_FOUND if pk not in linked
+            else RELATION_EXISTS if linked[pk] else RELATION_CREATED
+            for pk in target_ids
+        }
+
+    def remove_many(self, owner, target_ids):
+        """Unlink ``owner`` from ``target_ids`` with a single DELETE.
+
+        Returns ``{target_id: outcome}`` like add_many().
+        """
+        self._for_write = True
+        linked = self._classify(owner, target_ids)
+        deleted = [pk for pk, exists in linked.items() if exists]
+        if deleted:
+            with transaction.atomic(using=self.db):
+                self.filter(**{
+                    self.owner_field: owner,
+                    f"{self.target_field}_id__in": deleted,
+                })._raw_delete(self.db)
+                self._relations_changed(owner, deleted, -1)
+            bulk_relations_changed.send(
+                sender=self.model, owner=owner, target_ids=deleted, sign=-1)
+
+        return {
+            pk: RELATION_NOT_FOUND if pk not in linked
+            else RELATION_DELETED if linked[pk] else RELATION_MISSING
+            for pk in target_ids
+        }
+
+    def _classify(self, owner, target_ids):
+        """``{target_id: already linked}`` for the targets that exist."""
+        target_model = self.model._meta.get_field(
+            self.target_field).related_model
+        return dict(
+            target_model.objects.filter(pk__in=target_ids)
+            .annotate(linked=models.Exists(self.model.objects.filter(**{
+                self.owner_field: owner,
+                self.target_field: models.OuterRef("pk"),
+            })))
+            .order_by()
+            .values_list("pk", "linked")
+        )
+
+    def _relations_changed(self, owner, target_ids, sign):
+        """Bulk counterpart of the post_save/post_delete receivers."""
+        raise NotImplementedError
+
+
+class UserRecipeRelationQuerySet(RelationQuerySet):
+
+    def _relations_changed(self, user, recipe_ids, sign):
+        Recipe.objects.filter(pk__in=recipe_ids).adjust_counter(
+            self.model.counter_field, sign)
+
+
+class ShoppingCartQuerySet(UserRecipeRelationQuerySet):
+
+    def _relations_changed(self, user, recipe_ids, sign):
+        super()._relations_changed(user, recipe_ids, sign)
+        ShoppingListItem.objects.apply_deltas([user.pk], {
+            ingredient_id: sign * total
+            for ingredient_id, total in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values("ingredient").annotate(
+                total=models.Sum("amount")
+            ).order_by().values_list("ingredient", "total")
+        })
+
+
 class UserRecipeRelation(models.Model):
     user = models.ForeignKey(
         User,
@@ -173,6 +534,12 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата добавления",
+    )
+
+    objects = UserRecipeRelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -189,6 +556,9 @@ class UserRecipeRelation(models.Model):
 
 class Favorite(UserRecipeRelation):
 
+    counter_field = "favorites_count"
+    activity_field = "favorites"
+
     class Meta(UserRecipeRelation.Meta):
         verbose_name = "Избранное"
         verbose_name_plural = "Избранные"
@@ -197,12 +567,397 @@ class Favorite(UserRecipeRelation):
 
 class ShoppingCart(UserRecipeRelation):
 
+    counter_field = "shopping_carts_count"
+    activity_field = "shopping_carts"
+
+    objects = ShoppingCartQuerySet.as_manager()
+
     class Meta(UserRecipeRelation.Meta):
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
         default_related_name = "shopping_carts"
 
 
+class RecipeActivityQuerySet(models.QuerySet):
+
+    def record(self, recipe_ids, field, at=None):
+        """Count one ``field`` event for each recipe in the hour of ``at``.
+
+        A single INSERT ... ON CONFLICT DO UPDATE adds to existing buckets.
+        """
+        bucket = (at or timezone.now()).replace(
+            minute=0, second=0, microsecond=0)
+        recipe_ids = sorted(set(recipe_ids))
+        if not recipe_ids:
+            return
+        self._for_write = True
+        connection = connections[self.db]
+        if not connection.features.supports_update_conflicts_with_target:
+            with transaction.atomic(using=self.db):
+                rows = self.select_for_update().filter(
+                    recipe_id__in=recipe_ids, bucket=bucket)
+                existing = set(rows.values_list("recipe_id", flat=True))
+                rows.update(**{field: models.F(field) + 1})
+                self.bulk_create(
+                    self.model(recipe_id=pk, bucket=bucket, **{field: 1})
+                    for pk in recipe_ids if pk not in existing
+                )
+            return
+
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        columns = [
+            opts.get_field(name).column
+            for name in ("recipe", "bucket", "favorites", "shopping_carts")
+        ]
+        column = quote_name(opts.get_field(field).column)
+        sql = (
+            "INSERT INTO {table} ({columns}) VALUES {values} "
+            "ON CONFLICT ({recipe}, {bucket}) "
+            "DO UPDATE SET {column} = {table}.{column} + EXCLUDED.{column}"
+        ).format(
+            table=quote_name(opts.db_table),
+            columns=", ".join(map(quote_name, columns)),
+            values=", ".join(["(%s, %s, %s, %s)"] * len(recipe_ids)),
+            recipe=quote_name(columns[0]),
+            bucket=quote_name(columns[1]),
+            column=column,
+        )
+        bucket = opts.get_field("bucket").get_db_prep_save(bucket, connection)
+        params = []
+        for pk in recipe_ids:
+            params += [
+                pk, bucket, int(field == "favorites"),
+                int(field == "shopping_carts"),
+            ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def compact(self, before):
+        """Merge the hourly rows of days older than ``before`` into one row
+        per recipe and day; returns the number of rows merged.
+
+        ``before`` should be a midnight, so that no day is split between
+        merged and hourly rows.
+        """
+        self._for_write = True
+        with transaction.atomic(using=self.db):
+            days = set(
+                self.filter(bucket__lt=before)
+                .annotate(day=TruncDay("bucket"))
+                .exclude(bucket=models.F("day"))
+                .values_list("day", flat=True)
+            )
+            if not days:
+                return 0
+            rows = self.annotate(day=TruncDay("bucket")).filter(day__in=days)
+            merged = [
+                self.model(bucket=day, **totals)
+                for day, totals in (
+                    (row.pop("day"), row)
+                    for row in rows.values("recipe_id", "day").annotate(
+                        favorites=models.Sum("favorites"),
+                        shopping_carts=models.Sum("shopping_carts"),
+                    ).order_by()
+                )
+            ]
+            count = rows.order_by()._raw_delete(self.db)
+            self.bulk_create(merged, batch_size=1000)
+        return count - len(merged)
+
+    def trending(self, limit, now=None):
+        """``(recipe_id, score)`` of the ``limit`` most active recipes.
+
+        Every event scores its weight, halved every TRENDING_HALF_LIFE_HOURS
+        since its bucket; buckets older than TRENDING_WINDOW_DAYS are
+        ignored.
+        """
+        now = now or timezone.now()
+        half_life = timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+        rows = self.filter(
+            bucket__gte=now - timedelta(days=TRENDING_WINDOW_DAYS))
+        buckets = rows.values_list("bucket", flat=True).distinct().order_by()
+        decay = [
+            models.When(
+                bucket=bucket,
+                then=models.Value(0.5 ** ((now - bucket) / half_life)),
+            )
+            for bucket in buckets
+        ]
+        if not decay:
+            return []
+        return list(
+            rows.values("recipe_id").annotate(score=models.Sum(
+                (
+                    models.F("favorites") * TRENDING_FAVORITE_WEIGHT
+                    + models.F("shopping_carts")
+                    * TRENDING_SHOPPING_CART_WEIGHT
+                ) * models.Case(*decay, output_field=models.FloatField()),
+                output_field=models.FloatField(),
+            ))
+            .order_by("-score", "-recipe_id")
+            .values_list("recipe_id", "score")[:limit]
+        )
+
+
+class RecipeActivity(models.Model):
+    """Favorite and shopping cart additions per recipe and hour.
+
+    Old hours are merged into days by the compact_recipe_activity
+    command, so trending scores read a few rows per recipe instead of
+    the relation tables.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="activity",
+        verbose_name="Рецепт",
+    )
+    bucket = models.DateTimeField(
+        db_index=True,
+        verbose_name="Начало интервала",
+    )
+    favorites = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлений в избранное",
+    )
+    shopping_carts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлений в список покупок",
+    )
+
+    objects = RecipeActivityQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Активность рецепта"
+        verbose_name_plural = "Активность рецептов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "bucket"], name="unique_recipe_activity"
+            )
+        ]
+        ordering = ("-bucket",)
+
+    def __str__(self):
+        return f"{self.recipe} : {self.bucket}"
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+
+    def apply_deltas(self, user_ids, deltas):
+        """Add ``deltas`` ({ingredient_id: amount}) to the lists of users."""
+        user_ids = list(user_ids)
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+
+        with transaction.atomic():
+            items = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas.keys()
+                )
+            }
+            changed, created, emptied = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, delta in deltas.items():
+                    item = items.get((user_id, ingredient_id))
+                    if item is None:
+                        if delta > 0:
+                            created.append(self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                total=delta,
+                            ))
+                    elif item.total + delta > 0:
+                        item.total += delta
+                        changed.append(item)
+                    else:
+                        emptied.append(item.pk)
+
+            self.filter(pk__in=emptied).delete()
+            self.bulk_update(changed, ["total"])
+            self.bulk_create(created)
+
+    def rebuild(self, batch_size=1000):
+        """Recalculate every list from ShoppingCart and IngredientInRecipe."""
+        totals = (
+            IngredientInRecipe.objects.filter(
+                recipe__shopping_carts__isnull=False
+            )
+            .values(
+                "ingredient", user=models.F("recipe__shopping_carts__user")
+            )
+            .annotate(amount_total=models.Sum("amount"))
+            .order_by()
+        )
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for row in totals.iterator(chunk_size=batch_size):
+                batch.append(self.model(
+                    user_id=row["user"],
+                    ingredient_id=row["ingredient"],
+                    total=row["amount_total"],
+                ))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class ShoppingListItem(models.Model):
+    """Ingredient totals over all recipes in the user's shopping cart."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    total = models.PositiveIntegerField(verbose_name="Общее количество")
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Позиции списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_item",
+            )
+        ]
+        ordering = ("user",)
+
+    def __str__(self):
+        return f"{self.user} : {self.ingredient} {self.total}"
+
+
+class FeedItemQuerySet(models.QuerySet):
+
+    def fan_out(self, recipe, batch_size=1000):
+        """Deliver a new recipe to the inboxes of its author's followers."""
+        user_ids = Subscription.objects.filter(
+            author_id=recipe.author_id, subscriber__has_feed_inbox=True
+        ).order_by().values_list("subscriber_id", flat=True)
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe=recipe,
+                           created=recipe.created)
+                for user_id in user_ids.iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+    def add_authors(self, user_id, author_ids, per_author=FEED_INBOX_BACKFILL):
+        """Copy the latest recipes of newly followed authors into the
+        inbox, if the user has one."""
+        if not User.objects.filter(pk=user_id, has_feed_inbox=True).exists():
+            return
+        recipes = Recipe.objects.filter(author_id__in=author_ids).annotate(
+            row_number=models.Window(
+                RowNumber(),
+                partition_by=models.F("author"),
+                order_by=(models.F("created").desc(), models.F("pk").desc()),
+            )
+        ).filter(row_number__lte=per_author).values_list("pk", "created")
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe_id=pk, created=created)
+                for pk, created in recipes.iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def remove_authors(self, user_id, author_ids):
+        self.filter(
+            user_id=user_id, recipe__author_id__in=author_ids
+        ).delete()
+
+    def build(self, user_id):
+        """Create the inbox of a user who follows many authors."""
+        with transaction.atomic():
+            User.objects.filter(pk=user_id).update(has_feed_inbox=True)
+            self.filter(user_id=user_id).delete()
+            self.add_authors(
+                user_id,
+                Subscription.objects.filter(subscriber_id=user_id)
+                .order_by().values_list("author_id", flat=True),
+            )
+
+
+class FeedItem(models.Model):
+    """A recipe in the inbox of a user who follows many authors.
+
+    Such feeds are assembled on publication instead of merging thousands
+    of per-author streams on every read.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Пользователь",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Рецепт",
+    )
+    # Copy of Recipe.created, so that the inbox is read from one index.
+    created = models.DateTimeField(verbose_name="Дата публикации")
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_item"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("user", "-created", "-recipe"),
+                name="feed_item_user_created_idx",
+            ),
+        ]
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"{self.user} : {self.recipe}"
+
+
+class SubscriptionQuerySet(RelationQuerySet):
+    owner_field = "subscriber"
+    target_field = "author"
+
+    def add_many(self, subscriber, author_ids):
+        outcomes = super().add_many(
+            subscriber, [pk for pk in author_ids if pk != subscriber.pk])
+        return {
+            pk: outcomes.get(pk, RELATION_SELF) for pk in author_ids
+        }
+
+    def _relations_changed(self, subscriber, author_ids, sign):
+        User.objects.filter(pk__in=author_ids).adjust_counter(
+            "followers_count", sign)
+        User.objects.filter(pk=subscriber.pk).adjust_counter(
+            "following_count", sign * len(author_ids))
+
+
 class Subscription(models.Model):
 
     author = models.ForeignKey(
@@ -218,13 +973,19 @@ class Subscription(models.Model):
         verbose_name="Подписчик",
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         constraints = [
             models.UniqueConstraint(
                 fields=["subscriber", "author"], name="unique_subscription"
-            )
+            ),
+            models.CheckConstraint(
+                condition=~models.Q(subscriber=models.F("author")),
+                name="prevent_self_subscription",
+            ),
         ]
         ordering = ("author__username",)
 
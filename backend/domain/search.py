@@ -0,0 +1,109 @@
+"""Full-text recipe search.
+
+PostgreSQL: a stored generated tsvector column (``russian`` configuration,
+name weighted above text) with a GIN index, ranked by ts_rank.
+SQLite: an FTS5 table kept in sync from the Recipe signals, ranked by
+bm25. FTS5 has no Russian stemmer, so query words are cut to a rough stem
+and matched as prefixes. Other databases fall back to icontains.
+"""
+import re
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = "domain_recipe_search"
+POSTGRES_CONFIG = "russian"
+# Inflection endings stripped from SQLite query words, longest first.
+ENDINGS = sorted(
+    (
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+        "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ов", "ев", "ах",
+        "ях", "ом", "ем", "ам", "ям", "а", "я", "о", "е", "ы", "и", "у",
+        "ю", "ь",
+    ),
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def fold(value):
+    return value.replace("ё", "е").replace("Ё", "Е")
+
+
+def rough_stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and (
+            len(word) - len(ending) >= MIN_STEM_LENGTH
+        ):
+            return word[:-len(ending)]
+    return word
+
+
+def search_recipes(queryset, query):
+    """Recipes matching ``query``, best matches first (``search_rank``)."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _search_postgresql(queryset, query)
+    if vendor == "sqlite":
+        return _search_sqlite(queryset, query)
+    return queryset.filter(
+        models.Q(name__icontains=query) | models.Q(text__icontains=query)
+    )
+
+
+def _search_postgresql(queryset, query):
+    table = queryset.model._meta.db_table
+    tsquery = "websearch_to_tsquery(%s, %s)"
+    params = (POSTGRES_CONFIG, query)
+    return queryset.filter(RawSQL(
+        f'"{table}"."search_vector" @@ {tsquery}',
+        params,
+        output_field=models.BooleanField(),
+    )).annotate(search_rank=RawSQL(
+        f'ts_rank("{table}"."search_vector", {tsquery})',
+        params,
+        output_field=models.FloatField(),
+    )).order_by("-search_rank", "-created")
+
+
+def _search_sqlite(queryset, query):
+    words = re.findall(r"\w+", fold(query).casefold())
+    if not words:
+        return queryset.none()
+    match = " ".join(f'"{rough_stem(word)}"*' for word in words)
+    table = queryset.model._meta.db_table
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        (match,),
+    )).annotate(search_rank=RawSQL(
+        # Column weights: a hit in the name counts ten times one in text.
+        f"SELECT -bm25({SEARCH_TABLE}, 10.0, 1.0) FROM {SEARCH_TABLE} "
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        (match,),
+        output_field=models.FloatField(),
+    )).order_by("-search_rank", "-created")
+
+
+def index_recipe(recipe, using):
+    """Refresh the recipe's FTS5 row. PostgreSQL needs nothing here."""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [recipe.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, text) "
+            "VALUES (%s, %s, %s)",
+            [recipe.pk, fold(recipe.name), fold(recipe.text)],
+        )
+
+
+def unindex_recipe(recipe, using):
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [recipe.pk])
@@ -1,23 +1,29 @@
+from django.db import transaction
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 
 from api.serializers import UserProfileSerializer
+from api.viewer import get_viewer
 
-from .constants import INGREDIENT_MIN_AMOUNT_IN_RECIPE
+from .constants import (
+    BULK_RELATIONS_MAX_RECIPES,
+    BULK_SUBSCRIPTIONS_MAX_AUTHORS,
+    IMAGE_RENDITIONS,
+    INGREDIENT_MIN_AMOUNT_IN_RECIPE
+)
+from .images import RenditionImageField, RenditionSrcsetField
 from .models import (
-    Favorite,
     Ingredient,
     IngredientInRecipe,
     Recipe,
     ShoppingCart,
-    Subscription
+    ShoppingListItem,
+    recipe_ingredients_changed
 )
 
 
 class SubscriptionSerializer(UserProfileSerializer):
     recipes = serializers.SerializerMethodField(method_name="get_recipes")
-    recipes_count = serializers.SerializerMethodField(
-        method_name="get_recipes_count")
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserProfileSerializer.Meta):
         fields = ("recipes",
@@ -26,12 +32,14 @@ class SubscriptionSerializer(UserProfileSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        author = obj
-        recipes = author.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
+        if hasattr(obj, "limited_recipes"):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = request.query_params.get('recipes_limit')
 
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
 
         return ShortRecipeSerializer(
             recipes,
@@ -39,41 +47,6 @@ class SubscriptionSerializer(UserProfileSerializer):
             context={'request': request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class CreateSubscriptionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscription
-        fields = ('author', 'subscriber')
-        extra_kwargs = {
-            'author': {'write_only': True},
-            'subscriber': {'write_only': True},
-        }
-
-    def validate(self, data):
-        if data['subscriber'] == data['author']:
-            raise serializers.ValidationError(
-                "Вы не можете подписаться на самого себя!"
-            )
-
-        if Subscription.objects.filter(
-            subscriber=data['subscriber'],
-            author=data['author']
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого автора')
-
-        return data
-
-    def to_representation(self, instance):
-        serializer = SubscriptionSerializer(
-            instance.author,
-            context=self.context
-        )
-        return serializer.data
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source="ingredient.id")
@@ -107,6 +80,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = RenditionImageField(fit=IMAGE_RENDITIONS["full"])
+    image_srcset = RenditionSrcsetField(source="image")
 
     class Meta:
         model = Recipe
@@ -118,23 +93,21 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_srcset",
             "text",
             "cooking_time",
         )
 
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        return (
-            request is not None
-            and request.user.is_authenticated
-            and request.user.favorites.filter(recipe=obj).exists()
-        )
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
+        return get_viewer(self.context.get("request")).has_favorite(obj)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return obj.shopping_carts.filter(user=request.user).exists()
-        return False
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
+        return get_viewer(
+            self.context.get("request")).has_in_shopping_cart(obj)
 
 
 class CreateShortIngredientsSerializer(serializers.ModelSerializer):
@@ -145,14 +118,6 @@ class CreateShortIngredientsSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ("id", "amount")
 
-    def validate_id(self, ingredient_id):
-        if not Ingredient.objects.filter(id=ingredient_id).exists():
-            raise serializers.ValidationError(
-                f"Ингредиента с id {ingredient_id} не существует."
-            )
-
-        return ingredient_id
-
     def validate_amount(self, value):
         if value < INGREDIENT_MIN_AMOUNT_IN_RECIPE:
             raise serializers.ValidationError(
@@ -165,7 +130,8 @@ class CreateShortIngredientsSerializer(serializers.ModelSerializer):
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
     ingredients = CreateShortIngredientsSerializer(many=True)
-    image = Base64ImageField(required=True)
+    image = RenditionImageField(
+        required=True, fit=IMAGE_RENDITIONS["full"])
 
     class Meta:
         model = Recipe
@@ -179,11 +145,30 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        # Renditions written on commit, replacing the image, are not on
+        # the saved instance yet.
+        instance.refresh_from_db(fields=("image", "image_renditions"))
         serializer = RecipeSerializer(
             instance, context={"request": self.context.get("request")}
         )
         return serializer.data
 
+    def validate_ingredients(self, ingredients):
+        ingredients_ids = {el["id"] for el in ingredients}
+        existing_ids = set(
+            Ingredient.objects.filter(id__in=ingredients_ids)
+            .values_list("id", flat=True)
+        )
+        if existing_ids == ingredients_ids:
+            return ingredients
+
+        raise serializers.ValidationError([
+            {} if el["id"] in existing_ids else {
+                "id": [f"Ингредиента с id {el['id']} не существует."]
+            }
+            for el in ingredients
+        ])
+
     def validate(self, data):
         ingredients = data.get("ingredients")
         if not data.get('image'):
@@ -203,22 +188,72 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients")
 
         user = self.context.get("request").user
         recipe = Recipe.objects.create(**validated_data, author=user)
         self.create_ingredients(ingredients, recipe)
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=recipe,
+            ingredient_ids=[element["id"] for element in ingredients],
+        )
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-
-        self.create_ingredients(validated_data.pop("ingredients"), instance)
+        self.update_ingredients(validated_data.pop("ingredients"), instance)
 
         return super().update(instance, validated_data)
 
+    def update_ingredients(self, ingredients, recipe):
+        """Apply only the difference between stored and submitted rows."""
+        amounts = {element["id"]: element["amount"] for element in ingredients}
+        current = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+
+        deltas = {
+            ingredient_id: -row.amount
+            for ingredient_id, row in current.items()
+        }
+        for ingredient_id, amount in amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+
+        IngredientInRecipe.objects.filter(
+            recipe=recipe,
+            ingredient_id__in=current.keys() - amounts.keys()
+        ).delete()
+
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ["amount"])
+
+        added = [
+            element for element in ingredients
+            if element["id"] not in current
+        ]
+        if added:
+            self.create_ingredients(added, recipe)
+            recipe_ingredients_changed.send(
+                sender=Recipe, recipe=recipe, ingredient_ids=amounts.keys()
+            )
+
+        ShoppingListItem.objects.apply_deltas(
+            ShoppingCart.objects.filter(recipe=recipe)
+            .values_list("user_id", flat=True),
+            deltas,
+        )
+
     def create_ingredients(self, ingredients, recipe):
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
@@ -231,54 +266,31 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image = RenditionImageField(fit=IMAGE_RENDITIONS["card"])
+    image_srcset = RenditionSrcsetField(source="image")
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_srcset", "cooking_time")
 
 
-class UserRecipeRelationSerializer(serializers.Serializer):
-
-    class Meta:
-        fields = ("user", "recipe")
-
-    def to_representation(self, instance):
-        serializer = ShortRecipeSerializer(
-            instance.recipe,
-            context=self.context
-        )
-        return serializer.data
-
-    def validate(self, data, related_name):
-        user = data.get("user")
-        recipe = data.get("recipe")
-
-        if getattr(user, related_name).filter(recipe__id=recipe.id).exists():
-            raise serializers.ValidationError(
-                f"{related_name} пользователя {user.username} "
-                f"уже содержит рецепт {recipe.name}."
-            )
-
-        return data
-
-
-class FavoriteSerializer(
-    UserRecipeRelationSerializer, serializers.ModelSerializer
-):
-
-    class Meta(UserRecipeRelationSerializer.Meta):
-        model = Favorite
-
-    def validate(self, data):
-        return super().validate(data, "favorites")
+class AuthorIdsSerializer(serializers.Serializer):
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_SUBSCRIPTIONS_MAX_AUTHORS,
+    )
 
+    def validate_authors(self, value):
+        return list(dict.fromkeys(value))
 
-class ShoppingCartSerializer(
-    UserRecipeRelationSerializer, serializers.ModelSerializer
-):
 
-    class Meta(UserRecipeRelationSerializer.Meta):
-        model = ShoppingCart
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RELATIONS_MAX_RECIPES,
+    )
 
-    def validate(self, data):
-        return super().validate(data, "shopping_carts")
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,144 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .images import (
+    IMAGE_FIELDS,
+    renditions_are_current,
+    schedule_renditions
+)
+from .models import (
+    Favorite,
+    FeedItem,
+    IngredientInRecipe,
+    Recipe,
+    RecipeActivity,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscription,
+    User,
+    bulk_relations_changed
+)
+from .search import index_recipe, unindex_recipe
+
+# sender: ((counter model, foreign key on sender, counter field), ...)
+COUNTERS = {
+    Recipe: ((User, "author_id", "recipes_count"),),
+    Subscription: (
+        (User, "author_id", "followers_count"),
+        (User, "subscriber_id", "following_count"),
+    ),
+    Favorite: ((Recipe, "recipe_id", "favorites_count"),),
+    ShoppingCart: ((Recipe, "recipe_id", "shopping_carts_count"),),
+}
+
+
+def update_counters(sender, instance, delta):
+    for model, foreign_key, field in COUNTERS[sender]:
+        model.objects.filter(
+            pk=getattr(instance, foreign_key)
+        ).adjust_counter(field, delta)
+
+
+def recipe_amounts(recipe_id, sign=1):
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list("ingredient_id", "amount").order_by()
+    }
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.apply_deltas(
+            [instance.user_id], recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: a cascading recipe delete has not removed its
+    # ingredients yet.
+    ShoppingListItem.objects.apply_deltas(
+        [instance.user_id], recipe_amounts(instance.recipe_id, sign=-1)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, using, **kwargs):
+    index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    unindex_recipe(instance, using)
+
+
+@receiver(post_save, sender=Recipe)
+def deliver_to_feed_inboxes(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed_inbox(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.add_authors(
+            instance.subscriber_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed_inbox(sender, instance, **kwargs):
+    FeedItem.objects.remove_authors(
+        instance.subscriber_id, [instance.author_id])
+
+
+@receiver(bulk_relations_changed, sender=Subscription)
+def update_feed_inbox(sender, owner, target_ids, sign, **kwargs):
+    if sign > 0:
+        FeedItem.objects.add_authors(owner.pk, target_ids)
+    else:
+        FeedItem.objects.remove_authors(owner.pk, target_ids)
+
+
+# Only additions are counted: removals also come from cascading recipe
+# deletes, when a new activity row would reference a deleted recipe.
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def record_recipe_activity(sender, instance, created, **kwargs):
+    if created:
+        RecipeActivity.objects.record(
+            [instance.recipe_id], sender.activity_field, instance.created)
+
+
+@receiver(bulk_relations_changed, sender=Favorite)
+@receiver(bulk_relations_changed, sender=ShoppingCart)
+def record_bulk_recipe_activity(sender, target_ids, sign, **kwargs):
+    if sign > 0:
+        RecipeActivity.objects.record(target_ids, sender.activity_field)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def process_uploaded_image(sender, instance, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    if not renditions_are_current(instance, field_name):
+        schedule_renditions(instance, field_name)
@@ -0,0 +1,372 @@
+import re
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.caching import bump_generation, get_generation
+from api.filters import RecipeFilter
+from api.ingredient_recipe_index import ingredient_recipe_index
+from foodgram.constants import (
+    INGREDIENT_RECIPE_INDEX_GENERATION_KEY,
+    INGREDIENTS_SEARCH_LIMIT,
+    INGREDIENTS_SEARCH_MAX_LIMIT,
+    TOKEN_REVOCATION_GENERATION_KEY
+)
+
+from .images import RenditionSrcsetField
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    User
+)
+
+RECIPES_URL = "/api/recipes/"
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f"user{number}@example.com",
+        username=f"user{number}",
+        first_name="Имя",
+        last_name="Фамилия",
+        password="password-1234",
+    )
+
+
+class RecipeListTestCase(TestCase):
+    recipes_count = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.authors = authors = [
+            create_user(number) for number in range(1, 6)]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(3)
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[number % len(authors)],
+                name=f"Рецепт {number}",
+                text="Описание",
+                cooking_time=number + 1,
+                image="recipes/recipe.png",
+            )
+            for number in range(cls.recipes_count)
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient=cls.ingredients[(recipe.pk + shift) % 3],
+                amount=10,
+            )
+            for recipe in cls.recipes
+            for shift in range(2)
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::3]
+        )
+        Subscription.objects.create(subscriber=cls.user, author=authors[0])
+        cls.week_ago = timezone.now() - timedelta(days=7)
+        Recipe.objects.filter(pk__in=[
+            recipe.pk for recipe in cls.recipes[:10]
+        ]).update(created=cls.week_ago)
+        for recipe in cls.recipes[10:15]:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=recipe.pk)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.force_authenticate(self.user)
+
+    def get(self, client, params):
+        # Cached responses and counts would hide the queries being counted.
+        cache.clear()
+        response = client.get(RECIPES_URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+
+class RecipeListQueriesTest(RecipeListTestCase):
+
+    def assert_constant_queries(self, client):
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.get(client, {"limit": 1})
+        with self.assertNumQueries(len(one_recipe.captured_queries)):
+            response = self.get(client, {"limit": self.recipes_count})
+        self.assertEqual(
+            len(response.data["results"]), self.recipes_count)
+
+    def test_anonymous_list_queries_do_not_grow_with_page_size(self):
+        self.assert_constant_queries(self.anonymous)
+
+    def test_authorized_list_queries_do_not_grow_with_page_size(self):
+        self.assert_constant_queries(self.authorized)
+
+
+class RecipeFilterQueriesTest(RecipeListTestCase):
+    """Every filter and ordering keeps the query count of the plain list
+    and, on PostgreSQL, is served by its index."""
+
+    def setUp(self):
+        super().setUp()
+        with CaptureQueriesContext(connection) as plain_list:
+            self.get(self.anonymous, {"limit": self.recipes_count})
+        self.list_queries = len(plain_list.captured_queries)
+
+    def assert_filter(self, params, expected):
+        params = {**params, "limit": self.recipes_count}
+        with self.assertNumQueries(self.list_queries):
+            response = self.get(self.anonymous, params)
+        found = [recipe["id"] for recipe in response.data["results"]]
+        expected = list(expected.values_list("pk", flat=True))
+        if "ordering" not in params:
+            # The default order by created has ties.
+            found, expected = sorted(found), sorted(expected)
+        self.assertEqual(found, expected)
+
+    @staticmethod
+    def leading_column_indexes(model, column):
+        """Names of the indexes on the model's table starting with
+        ``column``, generated ones included."""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+        return [
+            name for name, constraint in constraints.items()
+            if constraint["index"] and constraint["columns"][:1] == [column]
+        ]
+
+    def assert_index_used(self, params, indexes):
+        queryset = RecipeFilter(params, queryset=Recipe.objects.all()).qs
+        with connection.cursor() as cursor:
+            # The test tables are small enough for a sequential scan.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        names = "|".join(map(re.escape, indexes))
+        self.assertRegex(
+            queryset[:10].explain(),
+            rf"Index .*\b(?:using|on) ({names})\b",
+        )
+
+    def test_cooking_time_range(self):
+        self.assert_filter(
+            {"cooking_time_min": 10, "cooking_time_max": 20},
+            Recipe.objects.filter(cooking_time__range=(10, 20)),
+        )
+
+    def test_created_range(self):
+        day_ago = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assert_filter(
+            {"created_after": day_ago},
+            Recipe.objects.filter(created__gte=day_ago),
+        )
+        self.assert_filter(
+            {"created_before": day_ago},
+            Recipe.objects.filter(created__lt=day_ago),
+        )
+
+    def test_multiple_authors(self):
+        authors = self.authors[:2]
+        self.assert_filter(
+            {"author": ",".join(str(author.pk) for author in authors)},
+            Recipe.objects.filter(author__in=authors),
+        )
+
+    def test_exclude_ingredients(self):
+        self.assert_filter(
+            {"exclude_ingredients": self.ingredients[0].pk},
+            Recipe.objects.exclude(ingredients=self.ingredients[0]),
+        )
+
+    def test_ordering(self):
+        self.assert_filter(
+            {"ordering": "popular"},
+            Recipe.objects.order_by("-favorites_count", "-id"),
+        )
+        self.assert_filter(
+            {"ordering": "newest"},
+            Recipe.objects.order_by("-created", "-id"),
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN on PostgreSQL")
+    def test_filters_use_indexes(self):
+        day_ago = (timezone.now() - timedelta(days=1)).isoformat()
+        cooking_time_indexes = self.leading_column_indexes(
+            Recipe, "cooking_time")
+        # recipe_author_created_idx or the foreign key index.
+        author_indexes = self.leading_column_indexes(Recipe, "author_id")
+        self.assertIn("recipe_author_created_idx", author_indexes)
+        for params, indexes in (
+            ({"cooking_time_min": 10, "cooking_time_max": 20},
+             cooking_time_indexes),
+            ({"created_after": day_ago}, ["recipe_created_idx"]),
+            ({"created_before": day_ago}, ["recipe_created_idx"]),
+            ({"author": f"{self.authors[0].pk},{self.authors[1].pk}"},
+             author_indexes),
+            ({"exclude_ingredients": self.ingredients[0].pk},
+             ["unique_ingredient_recipe_relation"]),
+            ({"ordering": "popular"}, ["recipe_popularity_idx"]),
+            ({"ordering": "newest"}, ["recipe_created_idx"]),
+        ):
+            with self.subTest(params=params):
+                self.assert_index_used(params, indexes)
+
+
+class SubscribeTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cannot_subscribe_to_self_with_padded_id(self):
+        for user_id in (str(self.user.pk), f"0{self.user.pk}"):
+            with self.subTest(user_id=user_id):
+                response = self.client.post(
+                    f"/api/users/{user_id}/subscribe/")
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_database_rejects_self_subscription(self):
+        with self.assertRaises(IntegrityError):
+            Subscription.objects.create(
+                subscriber=self.user, author=self.user)
+
+
+class TokenRevocationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def generation(self):
+        return get_generation(TOKEN_REVOCATION_GENERATION_KEY)
+
+    def test_profile_saves_keep_cached_tokens(self):
+        generation = self.generation()
+        self.user.last_name = "Другая"
+        self.user.save()
+        update_last_login(None, self.user)
+        self.assertEqual(self.generation(), generation)
+
+    def test_password_and_deactivation_revoke_cached_tokens(self):
+        for change in (
+            lambda user: user.set_password("password-5678"),
+            lambda user: setattr(user, "is_active", False),
+        ):
+            with self.subTest(change=change):
+                generation = self.generation()
+                user = User.objects.get(pk=self.user.pk)
+                change(user)
+                user.save()
+                self.assertNotEqual(self.generation(), generation)
+
+
+class IngredientSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Соль {number}", measurement_unit="г")
+            for number in range(INGREDIENTS_SEARCH_MAX_LIMIT + 1)
+        )
+
+    def setUp(self):
+        # A new index generation reloads the bulk-created ingredients.
+        cache.clear()
+
+    def test_limit_is_clamped(self):
+        for name in ("", "соль"):
+            for limit, expected in (
+                (None, INGREDIENTS_SEARCH_LIMIT),
+                ("0", INGREDIENTS_SEARCH_LIMIT),
+                ("-5", INGREDIENTS_SEARCH_LIMIT),
+                ("10", 10),
+                ("100000", INGREDIENTS_SEARCH_MAX_LIMIT),
+            ):
+                params = {"name": name}
+                if limit is not None:
+                    params["limit"] = limit
+                with self.subTest(params=params):
+                    response = APIClient().get("/api/ingredients/", params)
+                    self.assertEqual(len(response.data), expected)
+
+
+class IngredientRecipeIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.ingredient = Ingredient.objects.create(
+            name="Соль", measurement_unit="г")
+
+    def setUp(self):
+        cache.clear()
+        ingredient_recipe_index.refresh()
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name="Рецепт", text="Описание",
+                cooking_time=1, image="recipes/recipe.png")
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1)
+        # Past the reload throttle, a stale generation would reload.
+        ingredient_recipe_index._loaded_at = 0
+        return recipe
+
+    def test_own_writes_do_not_reload(self):
+        with mock.patch.object(
+            ingredient_recipe_index, "load",
+            wraps=ingredient_recipe_index.load,
+        ) as load:
+            recipe = self.create_recipe()
+            matches = ingredient_recipe_index.match([self.ingredient.pk])
+            self.assertEqual(load.call_count, 0)
+            bump_generation(INGREDIENT_RECIPE_INDEX_GENERATION_KEY)
+            self.create_recipe()
+            ingredient_recipe_index.match([self.ingredient.pk])
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(matches, [(recipe.pk, 1, 0)])
+
+
+class RenditionSrcsetTest(TestCase):
+
+    def test_widths_are_listed_once(self):
+        recipe = Recipe(image="recipes/recipe.png", image_renditions={
+            name: {"path": f"recipes/renditions/recipe_{name}.webp",
+                   "width": width}
+            for name, width in (("thumbnail", 160), ("card", 300),
+                                ("full", 300))
+        })
+        srcset = RenditionSrcsetField().to_representation(recipe.image)
+        self.assertEqual(
+            [entry.rsplit(" ", 1)[1] for entry in srcset.split(", ")],
+            ["160w", "300w"],
+        )
@@ -1,41 +1,64 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import F, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
 
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 
-from api.pagination import MainPagePagination
+from api.caching import AnonymousResponseCacheMixin
+from api.exporters import EXPORTERS, get_exporter
+from api.counting import CachedCount, EstimatedCount
+from api.pagination import (
+    CountingLimitOffsetPagination,
+    CursorPaginationOptInMixin,
+    FeedPagination,
+    MainPagePagination,
+    UserKeysetPagination
+)
 from api.permissions import IsAuthorOrReadOnly
-from api.filters import IngredientFilter, RecipeFilter
+from api.filters import RecipeFilter
+from api.ingredient_index import ingredient_index
 from api.serializers import UserProfileAvatarSerializer, UserProfileSerializer
+from api.viewer import get_viewer
+from foodgram.constants import (
+    INGREDIENTS_SEARCH_LIMIT,
+    INGREDIENTS_SEARCH_MAX_LIMIT,
+    SHOPPING_LIST_CHUNK_SIZE,
+    SHOPPING_LIST_DEFAULT_FORMAT,
+    SHOPPING_LIST_FILENAME,
+    TRENDING_RECIPES_CACHE_TIMEOUT,
+    TRENDING_RECIPES_LIMIT,
+    TRENDING_RECIPES_MAX_LIMIT
+)
 
+from .feed import recipe_feed
 from .models import (
     Favorite,
     Ingredient,
-    IngredientInRecipe,
     Recipe,
+    RecipeActivity,
     ShoppingCart,
     Subscription,
     User
 )
 from .serializers import (
+    AuthorIdsSerializer,
     CreateRecipeSerializer,
-    FavoriteSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
-    ShoppingCartSerializer,
     ShortIngredientsSerializer,
-    CreateSubscriptionSerializer,
+    ShortRecipeSerializer,
     SubscriptionSerializer
 )
 
@@ -49,19 +72,44 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = ShortIngredientsSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
-    search_fields = ("^name",)
     pagination_class = None
 
+    def list(self, request):
+        limit = request.query_params.get("limit", "")
+        limit = (
+            min(int(limit), INGREDIENTS_SEARCH_MAX_LIMIT)
+            if limit.isdigit() and int(limit) else INGREDIENTS_SEARCH_LIMIT
+        )
+        ingredients = ingredient_index.search(
+            request.query_params.get("name", ""), limit)
+        return Response(self.get_serializer(ingredients, many=True).data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(
+    AnonymousResponseCacheMixin,
+    CursorPaginationOptInMixin,
+    viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
     pagination_class = MainPagePagination
+    count_strategy = EstimatedCount(fallback=CachedCount())
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            return queryset.with_relations(get_viewer(self.request))
+        return queryset
+
+    def get_response_cache_timeout(self):
+        # Favorites and carts change the ranking without bumping the
+        # generation, so it is only kept briefly.
+        if self.action == "trending":
+            return TRENDING_RECIPES_CACHE_TIMEOUT
+        return super().get_response_cache_timeout()
+
     def get_serializer_class(self):
         if self.action in ("create", "partial_update"):
             return CreateRecipeSerializer
@@ -73,6 +121,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         context.update({"request": self.request})
         return context
 
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= selects the shopping list exporter, not a DRF renderer.
+        return super().perform_content_negotiation(
+            request,
+            force=force or self.action == "download_shopping_cart"
+        )
+
     @action(
         detail=True,
         methods=("post", "delete"),
@@ -82,15 +137,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         if request.method == "POST":
-            return self.create_user_recipe_relation(
-                request, pk, FavoriteSerializer
-            )
+            return self.create_user_recipe_relation(request, pk, Favorite)
         return self.delete_user_recipe_relation(
-            request,
-            pk,
-            "favorites",
-            Favorite.DoesNotExist,
-            "Рецепт не в избранном.",
+            request, pk, Favorite, "Рецепт не в избранном."
         )
 
     @action(
@@ -103,64 +152,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         if request.method == "POST":
             return self.create_user_recipe_relation(
-                request, pk, ShoppingCartSerializer
+                request, pk, ShoppingCart
             )
         return self.delete_user_recipe_relation(
-            request,
-            pk,
-            "shopping_carts",
-            ShoppingCart.DoesNotExist,
-            "Рецепт не в списке покупок (корзине).",
+            request, pk, ShoppingCart, "Рецепт не в списке покупок (корзине)."
         )
 
-    def create_user_recipe_relation(self, request, pk, serializer_class):
-        try:
-            Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
-            return Response(
-                {"detail": "Страница не найдена."},
-                status=status.HTTP_404_NOT_FOUND
-            )
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+        url_path="favorite/bulk",
+        url_name="favorite-bulk",
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_user_recipe_relations(request, Favorite)
 
-        serializer = serializer_class(
-            data={
-                "user": request.user.id,
-                "recipe": pk,
-            }
-        )
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart/bulk",
+        url_name="shopping_cart-bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_user_recipe_relations(request, ShoppingCart)
 
+    def bulk_user_recipe_relations(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    def delete_user_recipe_relation(
-        self,
-        request,
-        pk,
-        related_name_for_user,
-        does_not_exist_exception,
-        does_not_exist_message,
-    ):
-        try:
-            Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
+        if request.method == "POST":
+            write = model.objects.add_many
+        else:
+            write = model.objects.remove_many
+        outcomes = write(request.user, serializer.validated_data["recipes"])
+
+        return Response({"results": [
+            {"id": recipe_id, "status": outcome}
+            for recipe_id, outcome in outcomes.items()
+        ]})
+
+    def create_user_recipe_relation(self, request, pk, model):
+        recipe = Recipe.objects.filter(pk=pk).first()
+        if recipe is None:
             return Response(
                 {"detail": "Страница не найдена."},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        try:
-            getattr(request.user, related_name_for_user).get(
-                user=request.user, recipe_id=pk
-            ).delete()
-        except does_not_exist_exception:
+        # The unique constraint decides, so there is no check-then-insert
+        # race and no separate exists() query.
+        if not model.objects.add(request.user, recipe):
             return Response(
-                does_not_exist_message,
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    UniqueTogetherValidator.message.format(
+                        field_names="user, recipe")
+                ]},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            ShortRecipeSerializer(
+                recipe, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def delete_user_recipe_relation(
+        self, request, pk, model, does_not_exist_message
+    ):
+        if model.objects.remove(request.user, pk):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if not Recipe.objects.filter(pk=pk).exists():
+            return Response(
+                {"detail": "Страница не найдена."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(
+            does_not_exist_message,
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
     @action(
         detail=False,
@@ -170,39 +242,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_name="download_shopping_cart",
     )
     def download_shopping_cart(self, request):
-        shopping_cart_recipes = request.user.shopping_carts.all(
-        ).values_list('recipe_id', flat=True)
+        export_format = request.query_params.get(
+            "format", SHOPPING_LIST_DEFAULT_FORMAT)
+        exporter = get_exporter(export_format)
+        if exporter is None:
+            return Response(
+                {"format": [
+                    "Неподдерживаемый формат. Доступные форматы: {}.".format(
+                        ", ".join(EXPORTERS))
+                ]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         ingredients = (
-            IngredientInRecipe.objects.filter(
-                recipe_id__in=shopping_cart_recipes)
+            request.user.shopping_list_items
             .values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
+                'total',
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit')
             )
-            .annotate(total=Sum('amount'))
-            .order_by('ingredient__name')
+            .order_by('name')
         )
 
-        return self.ingredients_to_txt(ingredients)
-
-    @staticmethod
-    def ingredients_to_txt(ingredients):
-        shopping_list = "Список покупок:\n\n"
-        shopping_list += "\n".join(
-            f'• {ingredient['ingredient__name']} - {ingredient['total']} {
-                ingredient['ingredient__measurement_unit']}'
-            for ingredient in ingredients
+        return self.export_shopping_list(
+            ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE),
+            exporter
         )
 
-        response = HttpResponse(
-            shopping_list, content_type='text/plain; charset=utf-8'
+    @staticmethod
+    def export_shopping_list(ingredients, exporter):
+        response = StreamingHttpResponse(
+            exporter.stream(ingredients), content_type=exporter.content_type
         )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="{SHOPPING_LIST_FILENAME}.'
+            f'{exporter.format}"'
         )
         return response
 
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=(IsAuthenticated,),
+        url_path="feed",
+        url_name="feed",
+    )
+    def feed(self, request):
+        viewer = get_viewer(request)
+
+        def load(before, limit):
+            keys = recipe_feed(request.user, before, limit)
+            recipes = Recipe.objects.filter(
+                pk__in=[pk for _, pk in keys]
+            ).with_relations(viewer).in_bulk()
+            # A recipe may have been deleted since recipe_feed() ran.
+            return [recipes[pk] for _, pk in keys if pk in recipes]
+
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(load, Recipe, request)
+        serializer = RecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=(AllowAny,),
+        url_path="trending",
+        url_name="trending",
+    )
+    def trending(self, request):
+        return self.cached_response(self.list_trending, request)
+
+    def list_trending(self, request):
+        """Recipes most added to favorites and carts lately, by decayed
+        score from the RecipeActivity rollups."""
+        limit = request.query_params.get("limit", "")
+        limit = (
+            min(int(limit), TRENDING_RECIPES_MAX_LIMIT)
+            if limit.isdigit() and int(limit) else TRENDING_RECIPES_LIMIT
+        )
+        ranked = [
+            pk for pk, _ in RecipeActivity.objects.trending(limit)
+        ]
+        recipes = Recipe.objects.filter(pk__in=ranked).with_relations(
+            get_viewer(request)).in_bulk()
+        serializer = RecipeSerializer(
+            [recipes[pk] for pk in ranked if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response({"results": serializer.data})
+
     @action(
         detail=True,
         methods=("get",),
@@ -218,11 +350,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(data={"short-link": short_url})
 
 
-class UserProfileViewSet(UserViewSet):
+class UserProfileViewSet(CursorPaginationOptInMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = LimitOffsetPagination
+    pagination_class = CountingLimitOffsetPagination
+    count_strategy = EstimatedCount()
+    cursor_pagination_class = UserKeysetPagination
 
     @action(
         detail=False,
@@ -233,7 +367,7 @@ class UserProfileViewSet(UserViewSet):
     )
     def me(self, request):
         serializer = UserProfileSerializer(
-            request.user, context={"request": request}
+            self.current_user(request), context={"request": request}
         )
         return Response(serializer.data)
 
@@ -251,7 +385,7 @@ class UserProfileViewSet(UserViewSet):
 
     def create_avatar(self, request):
         serializer = UserProfileAvatarSerializer(
-            request.user,
+            self.current_user(request),
             data=request.data,
             partial=True,
             context={'request': request}
@@ -263,7 +397,7 @@ class UserProfileViewSet(UserViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def delete_avatar(self, request):
-        user = request.user
+        user = self.current_user(request)
         if user.avatar:
             user.avatar.delete()
             user.avatar = None
@@ -279,11 +413,10 @@ class UserProfileViewSet(UserViewSet):
         url_name="subscriptions",
     )
     def subscriptions(self, request):
-        subscriptions = Subscription.objects.filter(subscriber=request.user)
-        # Extract the authors (users being followed)
-        authors = [sub.author for sub in subscriptions]
+        authors = self.subscribed_authors(request).filter(
+            followers__subscriber=request.user
+        )
 
-        # Paginate the authors
         pages = self.paginate_queryset(authors)
         serializer = SubscriptionSerializer(
             pages, many=True, context={"request": request}
@@ -298,53 +431,94 @@ class UserProfileViewSet(UserViewSet):
         url_name="subscribe",
     )
     def subscribe(self, request, id):
+        # Compared as a number, so that a padded "01" is not another user.
+        if not id.isdigit():
+            return Response(
+                {"detail": "Страница не найдена."},
+                status=status.HTTP_404_NOT_FOUND
+            )
         if request.method == "POST":
-            return self.create_subscription(request, id)
-        return self.delete_subscription(request, id)
+            return self.create_subscription(request, int(id))
+        return self.delete_subscription(request, int(id))
 
     def create_subscription(self, request, id):
-        try:
-            User.objects.get(pk=id)
-        except User.DoesNotExist:
+        if request.user.pk == id:
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    "Вы не можете подписаться на самого себя!"
+                ]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        author = self.subscribed_authors(request).filter(pk=id).first()
+        if author is None:
             return Response(
                 {"detail": "Страница не найдена."},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = CreateSubscriptionSerializer(
-            data={
-                "subscriber": request.user.id,
-                "author": id,
-            },
-            context={"request": request},
-        )
-
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not Subscription.objects.add(request.user, author):
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    UniqueTogetherValidator.message.format(
+                        field_names="subscriber, author")
+                ]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        serializer = SubscriptionSerializer(
+            author, context={"request": request}
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_subscription(self, request, id):
-        try:
-            author = User.objects.get(pk=id)
-        except User.DoesNotExist:
+        if Subscription.objects.remove(request.user, id):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        author = User.objects.filter(pk=id).first()
+        if author is None:
             return Response(
                 {"detail": "Страница не найдена."},
                 status=status.HTTP_404_NOT_FOUND
             )
-
-        subscription = Subscription.objects.filter(
-            subscriber=request.user.id, author=id
+        return Response(
+            f"Вы не подписаны на {author}",
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-        if not subscription.exists():
-            return Response(
-                f"Вы не подписаны на {author}",
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+        url_path="subscribe/bulk",
+        url_name="subscribe-bulk",
+    )
+    def subscribe_bulk(self, request):
+        serializer = AuthorIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        subscription.delete()
+        if request.method == "POST":
+            write = Subscription.objects.add_many
+        else:
+            write = Subscription.objects.remove_many
+        outcomes = write(request.user, serializer.validated_data["authors"])
 
-        return Response(
-            f"Вы отписались от {author}", status=status.HTTP_204_NO_CONTENT
-        )
+        return Response({"results": [
+            {"id": author_id, "status": outcome}
+            for author_id, outcome in outcomes.items()
+        ]})
+
+    @staticmethod
+    def current_user(request):
+        """The user as stored: request.user may come from the token cache,
+        which keeps it across profile changes."""
+        return User.objects.get(pk=request.user.pk)
+
+    @staticmethod
+    def subscribed_authors(request):
+        """Authors as SubscriptionSerializer renders them for a follower."""
+        recipes_limit = request.query_params.get('recipes_limit')
+        return User.objects.with_recipes(
+            int(recipes_limit)
+            if recipes_limit and recipes_limit.isdigit() else None
+        ).annotate(is_subscribed=Value(True))
@@ -1,2 +1,37 @@
 MAIN_PAGE_RECORDS_LIMIT = 6
+PAGINATION_QUERY_PARAM = "pagination"
+CURSOR_PAGINATION = "cursor"
+COUNT_CACHE_KEY_PREFIX = "count:"
+COUNT_CACHE_TIMEOUT = 30
+COUNT_ESTIMATE_THRESHOLD = 100000
 DEFAULT_PAGE_SIZE = 6
+SHOPPING_LIST_FILENAME = "shopping_list"
+SHOPPING_LIST_DEFAULT_FORMAT = "txt"
+SHOPPING_LIST_CHUNK_SIZE = 500
+TOKEN_CACHE_KEY_PREFIX = "auth-token:"
+TOKEN_CACHE_MAX_SIZE = 10000
+TOKEN_CACHE_LOCAL_TTL = 30
+TOKEN_CACHE_SHARED_TTL = 300
+TOKEN_REVOCATION_GENERATION_KEY = "auth-token-revocation-generation"
+RECIPES_CACHE_KEY_PREFIX = "recipes-response:"
+RECIPES_CACHE_GENERATION_KEY = "recipes-response-generation"
+RECIPES_CACHE_TIMEOUT = 600
+INGREDIENTS_INDEX_GENERATION_KEY = "ingredients-index-generation"
+INGREDIENTS_SEARCH_LIMIT = 50
+INGREDIENTS_SEARCH_MAX_LIMIT = 200
+VIEWER_CACHE_KEY_PREFIX = "viewer:"
+VIEWER_CONTEXT_MAX_IDS = 5000
+INGREDIENT_RECIPE_INDEX_GENERATION_KEY = "ingredient-recipe-index-generation"
+INGREDIENT_RECIPE_INDEX_RELOAD_INTERVAL = 60
+RECIPE_MATCH_MAX_RESULTS = 1000
+RECIPE_MATCH_ALL = "all"
+RECIPE_MATCH_ANY = "any"
+RECIPE_MATCH_MISSING = "missing"
+RECIPE_MATCH_DEFAULT_MAX_MISSING = 1
+TRENDING_RECIPES_LIMIT = 20
+TRENDING_RECIPES_MAX_LIMIT = 100
+TRENDING_RECIPES_CACHE_TIMEOUT = 60
+RECIPE_ORDERINGS = {
+    "newest": ("-created", "-id"),
+    "popular": ("-favorites_count", "-id"),
+}
@@ -17,7 +17,12 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from .constants import DEFAULT_PAGE_SIZE
+from .constants import (
+    DEFAULT_PAGE_SIZE,
+    TOKEN_CACHE_LOCAL_TTL,
+    TOKEN_CACHE_MAX_SIZE,
+    TOKEN_CACHE_SHARED_TTL,
+)
 
 load_dotenv()
 
@@ -87,6 +92,33 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", default=None),
         "HOST": os.getenv("DB_HOST", default=None),
         "PORT": os.getenv("DB_PORT", default=None),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", default=60)),
+        "CONN_HEALTH_CHECKS": os.getenv(
+            "DB_CONN_HEALTH_CHECKS", default="True").lower() == "true",
+    }
+}
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_DEFAULT_LOCATIONS = {
+    "locmem": "foodgram",
+    "file": BASE_DIR / "cache",
+    "redis": "redis://redis:6379/1",
+}
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", default="locmem")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            default=CACHE_DEFAULT_LOCATIONS[CACHE_BACKEND]
+        ),
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", default=300)),
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", default="foodgram"),
     }
 }
 
@@ -125,6 +157,10 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# 0 processes uploaded images inline once the transaction commits.
+IMAGE_PROCESSING_WORKERS = int(
+    os.getenv("IMAGE_PROCESSING_WORKERS", default=2))
+
 
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "api.pagination.MainPagePagination",
@@ -133,10 +169,21 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
+TOKEN_CACHE_ALIAS = os.getenv("TOKEN_CACHE_ALIAS", default=None)
+TOKEN_CACHE_MAX_SIZE = int(
+    os.getenv("TOKEN_CACHE_MAX_SIZE", default=TOKEN_CACHE_MAX_SIZE))
+TOKEN_CACHE_LOCAL_TTL = int(
+    os.getenv("TOKEN_CACHE_LOCAL_TTL", default=TOKEN_CACHE_LOCAL_TTL))
+TOKEN_CACHE_SHARED_TTL = int(
+    os.getenv("TOKEN_CACHE_SHARED_TTL", default=TOKEN_CACHE_SHARED_TTL))
+
+# 0 reloads the viewer's favorite/cart/subscription ids on every request.
+VIEWER_CACHE_TIMEOUT = int(os.getenv("VIEWER_CACHE_TIMEOUT", default=0))
+
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
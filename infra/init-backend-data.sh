@@ -5,5 +5,5 @@ sleep 15s
 docker compose exec backend python manage.py migrate
 sleep 5s
 
-docker compose exec backend python manage.py loaddata data/domain.json
+docker compose exec backend python manage.py import_foodgram_data data/domain.json
 docker compose exec backend python manage.py createsuperuser
\ No newline at end of file